@@ -0,0 +1,273 @@
+"""
+Author: agent
+Filename: analysispool.py
+Version: 1.0 [2026/10/16]
+
+Description:
+Multi-process box averaging for the PiPark Smart Parking Sensor. Python
+threads share one core, so with hundreds of boxes the averaging of a frame
+is spread over several worker processes instead. Each frame is copied once
+into a block of shared memory, which every worker reads in place, and each
+worker adds up the pixels of its own share of the boxes. Only the totals of
+the boxes are sent back. Requires NumPy.
+
+The shared memory is created and the workers forked when the pool is
+created, which should be before any threads are started. A worker which dies
+is replaced, by forking the whole pool again.
+
+The boxes are shared out so that each worker reads roughly the same number
+of pixels. How long each worker takes is recorded, so that the number of
+workers can be tuned, and reported by the timing module when TIMING is set.
+
+"""
+
+# -----------------------------------------------------------------------------
+#  Imports
+# -----------------------------------------------------------------------------
+# python
+import multiprocessing
+import multiprocessing.sharedctypes
+import time
+
+# PiPark
+import data.settings as s
+import imageread
+import timing
+from imageread import numpy
+
+
+# -----------------------------------------------------------------------------
+#  Share Boxes
+# -----------------------------------------------------------------------------
+def share_boxes(areas, num_workers):
+    """
+    Share the boxes out between the workers, so that each has roughly the
+    same number of pixels to read. The largest boxes are given out first,
+    each to the worker with the fewest pixels so far.
+
+    Arguments:
+    areas -- NumPy array of the (x, y, w, h) of each box.
+    num_workers -- Number of workers.
+
+    Returns:
+    shares -- List of NumPy arrays of the indices of each worker's boxes,
+        in ascending order.
+
+    """
+    sizes = areas[:, 2].astype(numpy.int64) * areas[:, 3]
+    loads = [0 for i in range(num_workers)]
+    shares = [[] for i in range(num_workers)]
+
+    for index in numpy.argsort(-sizes, kind = "mergesort"):
+        worker = loads.index(min(loads))
+        loads[worker] += sizes[index]
+        shares[worker].append(index)
+
+    return [numpy.array(sorted(share), dtype = numpy.intp) for share in shares]
+
+
+# -----------------------------------------------------------------------------
+#  Run Worker
+# -----------------------------------------------------------------------------
+def run_worker(buffer, areas, connection):
+    """
+    Run by each worker process. For each (frame number, frame shape)
+    received, add up the pixels of the worker's boxes in the shared frame,
+    and send back the frame number, their totals and how long it took. Stops
+    on receiving None.
+
+    """
+    pixels = numpy.frombuffer(buffer, dtype = numpy.uint8)
+
+    while True:
+        request = connection.recv()
+        if request is None: break
+
+        number, shape = request
+        start = time.time()
+        frame = pixels[:shape[0] * shape[1] * shape[2]].reshape(shape)
+        totals = imageread.get_area_sums(frame, areas)
+        connection.send((number, totals, time.time() - start))
+
+    connection.close()
+
+
+# ==============================================================================
+#
+#   Analysis Pool
+#
+# ==============================================================================
+class AnalysisPool:
+    """
+    Pool of worker processes which average the boxes of one camera's frames.
+
+        layout -- boxstore.BoxLayout of the camera's boxes.
+        num_workers -- Number of worker processes.
+        shares -- Indices of the boxes of each worker, see share_boxes().
+        times -- timing.StageTimes of each worker, in seconds.
+        num_starts -- Number of times the workers have been forked.
+
+    The workers are started when the pool is created, and are stopped by
+    close().
+
+    """
+
+    layout = None
+    num_workers = 0
+    shares = None
+    times = None
+    num_starts = 0
+
+    __buffer = None
+    __pixels = None
+    __workers = None
+    __connections = None
+    __frame_number = 0
+
+    def __init__(self, layout, resolution, num_workers = None):
+        """
+        Arguments:
+        layout -- boxstore.BoxLayout of the camera's boxes.
+        resolution -- (width, height) of the frames analysed, after any
+            downsampling. A larger frame forks the workers again.
+
+        Keyword Arguments:
+        num_workers -- Number of worker processes (default =
+            ANALYSIS_WORKERS). No more workers are used than there are boxes.
+
+        """
+        if num_workers is None: num_workers = s.ANALYSIS_WORKERS
+        num_workers = max(1, min(num_workers, len(layout)))
+
+        self.layout = layout
+        self.num_workers = num_workers
+        self.shares = share_boxes(layout.areas, num_workers)
+        self.times = [timing.StageTimes() for i in range(num_workers)]
+
+        self.__start(resolution[0] * resolution[1] * 3)
+
+    def getAverages(self, image):
+        """
+        Return the average pixel of every box of a frame.
+
+        Arguments:
+        image -- PIL image or NumPy array of the frame, after any
+            downsampling.
+
+        Returns:
+        averages -- NumPy array of [R, G, B, average] rows, one for each box,
+            as returned by imageread.get_area_averages().
+
+        """
+        frame = image
+        if not isinstance(frame, numpy.ndarray):
+            frame = imageread.get_image_array(image)
+        frame = frame[:, :, :3]
+
+        shape = frame.shape
+        size = shape[0] * shape[1] * shape[2]
+        if len(self.__buffer) < size:
+            if s.IS_VERBOSE:
+                print "INFO: Frame larger than expected, restarting the",
+                print "analysis workers."
+            self.__start(size)
+        elif self.__workers is None:
+            self.__start(len(self.__buffer))
+
+        try:
+            totals = self.__sum(frame)
+        except (IOError, OSError, EOFError), err:
+            # a worker has died, so replace the workers, with new shared
+            # memory, and try once more
+            print "ERROR: Analysis worker failed (" + str(err) + "),",
+            print "restarting the analysis workers."
+            self.__start(len(self.__buffer))
+            totals = self.__sum(frame)
+
+        return imageread.get_means(totals, self.layout.areas, as_array = True)
+
+    def getReport(self):
+        """Return the mean and p90 milliseconds of each worker, as a string. """
+        lines = []
+
+        for i, times in enumerate(self.times):
+            if not times.count: continue
+            p90, = times.getPercentiles([90])
+            lines.append("worker %d: %d box(es), mean %.1f ms, p90 %.1f ms" % (
+                i + 1, len(self.shares[i]), 1000 * times.total / times.count,
+                1000 * p90))
+
+        return "\n".join(lines)
+
+    def close(self):
+        """Stop the worker processes. """
+        if self.__workers is None: return
+
+        for connection in self.__connections:
+            try:
+                connection.send(None)
+            except (IOError, EOFError):
+                pass
+            connection.close()
+        for worker in self.__workers:
+            worker.join(1)
+            if worker.is_alive(): worker.terminate()
+
+        self.__workers = None
+        self.__connections = None
+
+    def __sum(self, frame):
+        """
+        Copy a frame into the shared memory, the only copy made of it, and
+        have the workers add up the pixels of every box. Returns the totals.
+
+        """
+        shape = frame.shape
+        shared = self.__pixels[:shape[0] * shape[1] * shape[2]].reshape(shape)
+        shared[...] = frame
+
+        self.__frame_number += 1
+        number = self.__frame_number
+
+        for connection in self.__connections: connection.send((number, shape))
+
+        totals = numpy.zeros((len(self.layout), 3), dtype = numpy.int64)
+        for i, connection in enumerate(self.__connections):
+            # skip any replies left over from a frame whose exchange was cut
+            # short, so that its totals are never mistaken for this frame's
+            reply_number = None
+            while reply_number != number:
+                reply_number, share_totals, seconds = connection.recv()
+            totals[self.shares[i]] = share_totals
+
+            self.times[i].add(seconds)
+            timing.record("worker %d" % (i + 1), seconds)
+
+        return totals
+
+    def __start(self, size):
+        """Create the shared memory for frames of a size, and the workers. """
+        self.close()
+
+        # the workers are forked after the shared memory is created, and so
+        # inherit it rather than being sent a copy
+        self.__buffer = multiprocessing.sharedctypes.RawArray("B", size)
+        self.__pixels = numpy.frombuffer(self.__buffer, dtype = numpy.uint8)
+        self.__workers = []
+        self.__connections = []
+
+        for i, share in enumerate(self.shares):
+            connection, worker_connection = multiprocessing.Pipe()
+            worker = multiprocessing.Process(target = run_worker,
+                args = (self.__buffer, self.layout.areas[share],
+                    worker_connection), name = "analysis-%d" % (i + 1))
+            worker.daemon = True
+            worker.start()
+            worker_connection.close()
+
+            self.__workers.append(worker)
+            self.__connections.append(connection)
+
+        self.num_starts += 1
+        if s.IS_VERBOSE:
+            print "INFO: Started", self.num_workers, "analysis worker(s)."
@@ -0,0 +1,309 @@
+"""
+Author: agent
+Filename: boxstore.py
+Version: 1.0 [2026/10/16]
+
+Description:
+Registry of the parking spaces watched by a PiPark unit. Each space is given a
+dense index, from 0 to the number of spaces - 1 in order of space id, and the
+state of every space is kept in arrays indexed by it. Space ids therefore need
+not be small or contiguous, the state grows with the number of spaces rather
+than the largest id, and finding a space by its id is a single dictionary
+lookup.
+
+The geometry of each camera's boxes is worked out once, when the boxes are
+loaded, and also kept in arrays, so that each tick only needs whole-array
+operations rather than work per box.
+
+"""
+
+# -----------------------------------------------------------------------------
+#  Imports
+# -----------------------------------------------------------------------------
+# python
+import array
+
+# PiPark
+import data.settings as s
+from imageread import numpy
+
+# number of ticks a new status must be seen for before it is accepted
+CHANGE_TICKS = 3
+
+# status of a space. The numbers are those sent to the server.
+UNKNOWN = -1
+EMPTY = 0
+OCCUPIED = 1
+
+
+# -----------------------------------------------------------------------------
+#  Get Bounding Box
+# -----------------------------------------------------------------------------
+def get_bounding_box(boxes, resolution = None):
+    """
+    Return the smallest area of the picture which contains every box, i.e.
+    the only part of each frame that needs to be captured and analysed.
+
+    Arguments:
+    boxes -- Box data, as saved in setup_data.py.
+
+    Keyword Arguments:
+    resolution -- (width, height) of the picture, to which the area is
+        clipped (default = PICTURE_RESOLUTION).
+
+    Returns:
+    (x, y, w, h) -- The bounding box, or None if there are no boxes.
+
+    """
+    if not boxes: return None
+    if resolution is None: resolution = s.PICTURE_RESOLUTION
+
+    x1 = max(0, min(min(box[2], box[4]) for box in boxes))
+    y1 = max(0, min(min(box[3], box[5]) for box in boxes))
+    x2 = min(resolution[0], max(max(box[2], box[4]) for box in boxes))
+    y2 = min(resolution[1], max(max(box[3], box[5]) for box in boxes))
+
+    return (x1, y1, max(0, x2 - x1), max(0, y2 - y1))
+
+
+# ==============================================================================
+#
+#   Box Layout
+#
+# ==============================================================================
+class BoxLayout:
+    """
+    Geometry of one camera's boxes, parking spaces first and then control
+    points, held in contiguous arrays.
+
+        ids -- Id of each box.
+        types -- Type of each box, 0 for a space and 1 for a control point.
+        areas -- (x, y, w, h) of each box, where (x, y) is its top left
+            corner, whichever way round its corners were marked.
+        scale -- Factor by which the frames are downsampled.
+        num_spaces -- Number of parking spaces, i.e. the first rows.
+        num_controls -- Number of control points, i.e. the remaining rows.
+
+    Without NumPy the arrays are lists, and areas a list of tuples.
+
+    """
+
+    ids = None
+    types = None
+    areas = None
+    scale = 1
+    num_spaces = 0
+    num_controls = 0
+
+    def __init__(self, space_boxes, control_boxes, origin = (0, 0), scale = 1):
+        """
+        Arguments:
+        space_boxes -- Parking space boxes, as saved in setup_data.py.
+        control_boxes -- Control point boxes, as saved in setup_data.py.
+
+        Keyword Arguments:
+        origin -- (x, y) of the top left corner of the frames in the full
+            picture, when frames are cropped. The areas are moved so that
+            they are relative to it.
+        scale -- Factor by which the frames are downsampled, see
+            imageread.reduce_frame(). The areas are scaled to match.
+
+        Raises:
+        ValueError -- When a box has no width or no height, so it has no
+            pixels to average.
+
+        """
+        self.num_spaces = len(space_boxes)
+        self.num_controls = len(control_boxes)
+        self.scale = scale
+
+        rows = []
+        for box in list(space_boxes) + list(control_boxes):
+            x = min(box[2], box[4]) - origin[0]
+            y = min(box[3], box[5]) - origin[1]
+            w = abs(box[4] - box[2])
+            h = abs(box[5] - box[3])
+            if w == 0 or h == 0:
+                raise ValueError("Box " + str(box[0]) + " has no area.")
+
+            # a downsampled frame holds every scale'th pixel of the full frame,
+            # so keep the pixels of the box which are still in it, rounding
+            # the edges up. Every box keeps at least one pixel.
+            if scale > 1:
+                x1, y1 = -(-x // scale), -(-y // scale)
+                x2, y2 = -(-(x + w) // scale), -(-(y + h) // scale)
+                x, y, w, h = x1, y1, max(1, x2 - x1), max(1, y2 - y1)
+
+            rows.append((box[0], box[1], x, y, w, h))
+
+        if numpy is None:
+            self.ids = [row[0] for row in rows]
+            self.types = [row[1] for row in rows]
+            self.areas = [row[2:] for row in rows]
+            return
+
+        table = numpy.array(rows, dtype = numpy.int32).reshape(-1, 6)
+        self.ids = numpy.ascontiguousarray(table[:, 0])
+        self.types = numpy.ascontiguousarray(table[:, 1], dtype = numpy.int8)
+        self.areas = numpy.ascontiguousarray(table[:, 2:])
+
+    def __len__(self):
+        return self.num_spaces + self.num_controls
+
+    def getSpaceIds(self):
+        """Return the ids of the parking spaces. """
+        return self.ids[:self.num_spaces]
+
+
+# ==============================================================================
+#
+#   Box Store
+#
+# ==============================================================================
+class BoxStore:
+    """
+    Dense, id-indexed store of the status of every parking space.
+
+        ids -- Space id of each index, in ascending order.
+        status -- Status of each index, UNKNOWN until the first status has
+            been accepted and then EMPTY or OCCUPIED.
+        ticks -- Number of ticks each index has seen its new status for.
+
+    With NumPy these are NumPy arrays, otherwise they are built-in arrays.
+
+    """
+
+    ids = None
+    status = None
+    ticks = None
+
+    __index = None
+
+    def __init__(self, space_ids):
+        """
+        Arguments:
+        space_ids -- Ids of every parking space.
+
+        Raises:
+        ValueError -- When a space id appears more than once.
+
+        """
+        ids = sorted(space_ids)
+        self.__index = {}
+
+        for i, space_id in enumerate(ids):
+            if space_id in self.__index:
+                raise ValueError("Space id " + str(space_id)
+                    + " appears more than once.")
+            self.__index[space_id] = i
+
+        if numpy is None:
+            self.ids = array.array('l', ids)
+            self.status = array.array('b', [UNKNOWN for i in ids])
+            self.ticks = array.array('h', [CHANGE_TICKS for i in ids])
+        else:
+            self.ids = numpy.array(ids, dtype = numpy.int64)
+            self.status = numpy.full(len(ids), UNKNOWN, dtype = numpy.int8)
+            self.ticks = numpy.full(len(ids), CHANGE_TICKS, dtype = numpy.int16)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, space_id):
+        return space_id in self.__index
+
+    def index(self, space_id):
+        """
+        Return the dense index of a space.
+
+        Arguments:
+        space_id -- Id of the space.
+
+        Raises:
+        KeyError -- When there is no space with the id.
+
+        """
+        return self.__index[space_id]
+
+    def indices(self, space_ids):
+        """Return an array of the dense index of each of a list of ids. """
+        indices = [self.__index[space_id] for space_id in space_ids]
+        if numpy is None: return indices
+        return numpy.array(indices, dtype = numpy.intp)
+
+    def getStatus(self, space_id):
+        """Return the status of a space, found by its id. """
+        return self.status[self.__index[space_id]]
+
+    def countKnown(self):
+        """Return the number of spaces whose status is known. """
+        if numpy is None: return len(self.status) - self.status.count(UNKNOWN)
+        return int(numpy.count_nonzero(self.status != UNKNOWN))
+
+    def isPending(self, indices):
+        """
+        Return True if any of the spaces has been read with a new status
+        which has not yet been accepted, or has not been read at all.
+
+        Arguments:
+        indices -- Dense index of each space, from indices().
+
+        """
+        if numpy is None: return any(self.ticks[i] > 1 for i in indices)
+        return bool((self.ticks[indices] > 1).any())
+
+    def countOccupied(self):
+        """Return the number of occupied spaces. """
+        if numpy is None: return self.status.count(OCCUPIED)
+        return int(numpy.count_nonzero(self.status == OCCUPIED))
+
+    def update(self, indices, is_occupied):
+        """
+        Apply one tick of readings to some of the spaces. A space takes on a
+        new status once it has been read for CHANGE_TICKS ticks in a row, or
+        straight away if its status is unknown.
+
+        Arguments:
+        indices -- Dense index of each space read, from indices().
+        is_occupied -- Whether each space was read as occupied.
+
+        Returns:
+        changes -- List of (space id, status) of every space whose status
+            changed, in the order of indices.
+
+        """
+        if numpy is None: return self.__updateEach(indices, is_occupied)
+
+        readings = numpy.asarray(is_occupied, dtype = numpy.int8)
+        ticks = self.ticks[indices]
+        is_different = self.status[indices] != readings
+        is_changed = is_different & (ticks >= CHANGE_TICKS)
+
+        # count the ticks for which a new status has been read. The count
+        # starts again once the status changes, or the reading goes back to
+        # the current status.
+        self.ticks[indices] = numpy.where(is_different & ~is_changed,
+            ticks + 1, 1)
+
+        changed = indices[is_changed]
+        self.status[changed] = readings[is_changed]
+
+        return zip(self.ids[changed].tolist(), readings[is_changed].tolist())
+
+    def __updateEach(self, indices, is_occupied):
+        """Apply one tick of readings to the spaces one at a time. """
+        changes = []
+
+        for index, reading in zip(indices, is_occupied):
+            reading = OCCUPIED if reading else EMPTY
+
+            if self.status[index] == reading:
+                self.ticks[index] = 1
+            elif self.ticks[index] < CHANGE_TICKS:
+                self.ticks[index] += 1
+            else:
+                self.status[index] = reading
+                self.ticks[index] = 1
+                changes.append((self.ids[index], reading))
+
+        return changes
@@ -18,4 +18,21 @@ IS_VERBOSE = True
 PARK_ID = 1
 SERVER_PASS = "pi"
 SERVER_URL = "http://10.173.33.129/pipark/server/"
+CAPTURE_MODE = "memory"
+FRAME_RATE = 2
+FRAME_SOURCE = "picamera"
+FRAME_SOURCE_PATH = ""
+SERVER_CONNECT_TIMEOUT = 5
+SERVER_READ_TIMEOUT = 10
+SPOOL_LOCATION = "./data/spool.sqlite"
+CROP_TO_BOXES = False
+ANALYSIS_SCALE = 1
+ANALYSIS_SCALE_CHECK = 0
+MAX_PICTURE_DELAY = 10
+GATE_STEP = 8
+BOX_CACHE = True
+TIMING = False
+TIMING_INTERVAL = 300
+HEADLESS = False
+ANALYSIS_WORKERS = 0
 
@@ -0,0 +1,278 @@
+"""
+Author: agent
+Filename: framegate.py
+Version: 1.0 [2026/10/16]
+
+Description:
+Cheap change detection for the PiPark Smart Parking Sensor. Before a frame is
+analysed, a sparse grid of its pixels is compared with the same pixels of the
+last frame which was analysed. If none of them has changed by more than the
+threshold the scene is the same, and the results of the last analysis can be
+used again without averaging or comparing any boxes.
+
+When the scene has changed, the BoxCache does the same for each box: only the
+boxes whose own sample of pixels has changed are averaged and compared again.
+
+"""
+
+# -----------------------------------------------------------------------------
+#  Imports
+# -----------------------------------------------------------------------------
+# PiPark
+import data.settings as s
+import imageread
+import timing
+from imageread import numpy
+
+# analyse a frame (or box) at least this often, however still the scene is,
+# so that changes between the sampled pixels are never missed for long
+GATE_REFRESH = 30
+
+# each box is fingerprinted by a grid of this many by this many of its pixels
+FINGERPRINT_SIZE = 4
+
+
+# ==============================================================================
+#
+#   Frame Gate
+#
+# ==============================================================================
+class FrameGate:
+    """
+    Decides whether a frame differs enough from the last frame analysed to
+    be worth analysing. Frames are compared with the last frame analysed,
+    rather than the previous frame, so that a slow drift still adds up to a
+    change.
+
+        step -- Spacing in pixels of the grid of pixels compared.
+        threshold -- Largest change in any value of a pixel that is not a
+            change.
+        num_skipped -- Number of frames found unchanged in a row.
+        total_skipped -- Number of frames found unchanged in all.
+
+    """
+
+    step = 8
+    threshold = 0
+    num_skipped = 0
+    total_skipped = 0
+
+    __reference = None
+
+    def __init__(self, step = None, threshold = None):
+        """
+        Keyword Arguments:
+        step -- Spacing of the pixels compared (default = GATE_STEP).
+        threshold -- Largest change that is not a change (default =
+            IMAGE_THRESHOLD).
+
+        """
+        if step is None: step = s.GATE_STEP
+        if threshold is None: threshold = s.IMAGE_THRESHOLD
+
+        self.step = step
+        self.threshold = threshold
+
+    def hasChanged(self, image):
+        """
+        Return True if the frame should be analysed, i.e. it has changed since
+        the last frame analysed, or too many frames have been skipped. The
+        frame is then remembered as the last frame analysed.
+
+        Arguments:
+        image -- PIL image or NumPy array of the frame.
+
+        """
+        sample = self.__sample(image)
+        reference = self.__reference
+
+        if reference is None or self.num_skipped >= GATE_REFRESH:
+            is_changed = True
+        elif numpy is None:
+            is_changed = len(sample) != len(reference) or any(
+                abs(new - old) > self.threshold
+                for new_pixel, old_pixel in zip(sample, reference)
+                for new, old in zip(new_pixel, old_pixel))
+        else:
+            is_changed = (sample.shape != reference.shape or bool(
+                (numpy.abs(sample - reference) > self.threshold).any()))
+
+        if is_changed:
+            self.__reference = sample
+            self.num_skipped = 0
+        else:
+            self.num_skipped += 1
+            self.total_skipped += 1
+
+        return is_changed
+
+    def __sample(self, image):
+        """Return the grid of pixels of a frame which are compared. """
+        if numpy is None:
+            sampled = imageread.reduce_frame(image, self.step)
+            return list(sampled.convert("RGB").getdata())
+
+        frame = image
+        if not isinstance(frame, numpy.ndarray):
+            frame = imageread.get_image_array(image)
+
+        # a copy, as the frame's buffer may be reused for the next frame
+        return frame[::self.step, ::self.step, :3].astype(numpy.int16)
+
+
+# ==============================================================================
+#
+#   Box Cache
+#
+# ==============================================================================
+class BoxCache:
+    """
+    Cache of the average, and for spaces the decision, of every box of a
+    camera. Each box is fingerprinted by a small grid of its pixels, and is
+    only averaged again when a pixel of its fingerprint has changed by more
+    than the threshold since it was last averaged. Spaces are only compared
+    with the control points again when they have been averaged again, or
+    when a control point has. Requires NumPy.
+
+        hits -- Number of times a box's cached average was used.
+        misses -- Number of times a box had to be averaged again.
+
+    """
+
+    layout = None
+    threshold = 0
+    hits = 0
+    misses = 0
+
+    __points = None
+    __fingerprints = None
+    __ages = None
+    __averages = None
+    __differences = None
+    __is_occupied = None
+    __margins = None
+
+    def __init__(self, layout, threshold = None):
+        """
+        Arguments:
+        layout -- boxstore.BoxLayout of the camera's boxes.
+
+        Keyword Arguments:
+        threshold -- Largest change that is not a change (default =
+            IMAGE_THRESHOLD).
+
+        """
+        if threshold is None: threshold = s.IMAGE_THRESHOLD
+        self.layout = layout
+        self.threshold = threshold
+
+    def getHitRate(self):
+        """Return the fraction of box averages taken from the cache. """
+        total = self.hits + self.misses
+        if total == 0: return 0.0
+        return self.hits / float(total)
+
+    def measure(self, frame):
+        """
+        Decide whether each space in a frame is occupied, reusing the cached
+        results of every box which has not changed.
+
+        Arguments:
+        frame -- PIL image or NumPy array of the frame, after any
+            downsampling.
+
+        Returns:
+        (averages, differences, is_occupied, margins) -- The averages of
+            every box, then the results of imageread.compare_areas() for
+            every space.
+
+        """
+        if not isinstance(frame, numpy.ndarray):
+            frame = imageread.get_image_array(frame)
+
+        layout = self.layout
+        num_spaces = layout.num_spaces
+        if self.__points is None: self.__prepare(frame.shape)
+
+        # fingerprint every box at once, and find those which have changed
+        ys, xs = self.__points
+        fingerprints = frame[ys, xs, :3].astype(numpy.int16)
+
+        is_moved = (numpy.abs(fingerprints - self.__fingerprints)
+            > self.threshold).any(axis = (1, 2))
+        is_moved |= self.__ages >= GATE_REFRESH
+
+        moved = numpy.flatnonzero(is_moved)
+        self.misses += len(moved)
+        self.hits += len(layout) - len(moved)
+        self.__ages += 1
+
+        if len(moved):
+            self.__fingerprints[moved] = fingerprints[moved]
+            self.__ages[moved] = 0
+
+            # average the moved boxes, reading only their pixels unless they
+            # cover more than the frame, when an integral image is cheaper
+            areas = layout.areas[moved]
+            num_pixels = frame.shape[0] * frame.shape[1]
+            with timing.timed("averaging"):
+                if (areas[:, 2] * areas[:, 3]).sum() < num_pixels:
+                    totals = imageread.get_area_sums(frame, areas)
+                    self.__averages[moved] = imageread.get_means(totals,
+                        areas, as_array = True)
+                else:
+                    self.__averages[moved] = imageread.get_area_averages(
+                        frame, areas, as_array = True)
+
+        # compare the spaces which have moved with the control points, or
+        # every space if a control point has moved
+        if is_moved[num_spaces:].any(): spaces = numpy.arange(num_spaces)
+        else: spaces = moved[moved < num_spaces]
+
+        if len(spaces):
+            with timing.timed("compare"):
+                differences, votes, is_occupied, margins = \
+                    imageread.compare_areas(self.__averages[spaces],
+                    self.__averages[num_spaces:], self.threshold,
+                    with_margins = True)
+            self.__differences[spaces] = differences
+            self.__is_occupied[spaces] = is_occupied
+            self.__margins[spaces] = margins
+
+        return (self.__averages, self.__differences, self.__is_occupied,
+            self.__margins)
+
+    def __prepare(self, shape):
+        """Work out the pixels of each fingerprint, and create the cache. """
+        layout = self.layout
+        num_boxes = len(layout)
+        num_spaces = layout.num_spaces
+        height, width = shape[:2]
+
+        # a grid of points spread evenly over each box, clipped to the frame
+        steps = (numpy.arange(FINGERPRINT_SIZE) + 0.5) / FINGERPRINT_SIZE
+        areas = layout.areas.astype(numpy.float64)
+        xs = areas[:, 0:1] + areas[:, 2:3] * steps[numpy.newaxis, :]
+        ys = areas[:, 1:2] + areas[:, 3:4] * steps[numpy.newaxis, :]
+        xs = numpy.clip(xs.astype(numpy.intp), 0, width - 1)
+        ys = numpy.clip(ys.astype(numpy.intp), 0, height - 1)
+
+        # every combination of the x and y points of each box
+        self.__points = (
+            numpy.repeat(ys, FINGERPRINT_SIZE, axis = 1),
+            numpy.tile(xs, (1, FINGERPRINT_SIZE))
+            )
+
+        size = FINGERPRINT_SIZE * FINGERPRINT_SIZE
+        self.__fingerprints = numpy.zeros((num_boxes, size, 3),
+            dtype = numpy.int16)
+        # every box starts out too old to reuse, so that all of them are
+        # averaged in the first frame rather than compared with the empty
+        # fingerprints
+        self.__ages = numpy.empty(num_boxes, dtype = numpy.int32)
+        self.__ages.fill(GATE_REFRESH)
+        self.__averages = numpy.zeros((num_boxes, 4), dtype = numpy.int64)
+        self.__differences = numpy.zeros((num_spaces, layout.num_controls),
+            dtype = bool)
+        self.__is_occupied = numpy.zeros(num_spaces, dtype = bool)
+        self.__margins = numpy.zeros(num_spaces, dtype = numpy.int64)
@@ -0,0 +1,118 @@
+"""
+Author: agent
+Filename: framepool.py
+Version: 1.0 [2026/10/16]
+
+Description:
+Fixed pool of frame buffers for the PiPark Smart Parking Sensor. A frame
+source captures each frame into a buffer taken from its pool, and the frame
+is handed on through the pipeline as a NumPy view of that buffer, without
+being copied. Once the frame has been analysed it is released, and its
+buffer goes back to the pool to be captured into again. After the first few
+frames no more frame memory is allocated, however long PiPark runs.
+
+"""
+
+# -----------------------------------------------------------------------------
+#  Imports
+# -----------------------------------------------------------------------------
+# python
+import threading
+
+# default number of buffers in a pool: enough for the frames waiting in the
+# pipeline's frame queue, the frame being analysed and the frame being
+# captured
+FRAME_POOL_SIZE = 4
+
+
+# ==============================================================================
+#
+#   Frame Pool
+#
+# ==============================================================================
+class FramePool:
+    """
+    Pool of reusable frame buffers. Buffers are created as they are first
+    needed, up to 'size' of them. After that acquire() waits for a buffer to
+    be released.
+
+        size -- Most buffers created.
+        num_created -- Number of buffers created so far.
+
+    """
+
+    size = 0
+    num_created = 0
+
+    __create = None
+    __buffers = None
+    __free = None
+    __available = None
+
+    def __init__(self, create, size = FRAME_POOL_SIZE):
+        """
+        Arguments:
+        create -- Function returning a new, empty buffer, e.g. a NumPy array.
+
+        Keyword Arguments:
+        size -- Most buffers created.
+
+        """
+        self.size = size
+        self.__create = create
+        self.__buffers = {}
+        self.__free = []
+        self.__available = threading.Condition(threading.Lock())
+
+    def reserve(self, size):
+        """Allow at least 'size' buffers to be in use at once. """
+        with self.__available:
+            self.size = max(self.size, size)
+            self.__available.notify()
+
+    def acquire(self):
+        """
+        Return a free buffer, creating one if none are free and there are
+        fewer than 'size', and otherwise waiting until one is released.
+
+        """
+        with self.__available:
+            while not self.__free:
+                if self.num_created < self.size:
+                    buffer = self.__create()
+                    self.__buffers[id(buffer)] = buffer
+                    self.num_created += 1
+                    return buffer
+                self.__available.wait()
+
+            return self.__free.pop()
+
+    def release(self, frame):
+        """
+        Give a buffer back to the pool, so that it can be captured into
+        again. The frame must not be used afterwards.
+
+        Arguments:
+        frame -- A buffer from acquire(), or any NumPy view of one.
+
+        Returns:
+        Boolean -- True if the frame was from this pool.
+
+        """
+        # find the buffer which the view was taken from
+        buffer = frame
+        while buffer is not None and id(buffer) not in self.__buffers:
+            buffer = getattr(buffer, "base", None)
+        if buffer is None: return False
+
+        with self.__available:
+            if not any(free is buffer for free in self.__free):
+                self.__free.append(buffer)
+                self.__available.notify()
+
+        return True
+
+    def countFree(self):
+        """Return the number of buffers created but not in use. """
+        with self.__available:
+            return len(self.__free)
@@ -0,0 +1,682 @@
+"""
+Author: agent
+Filename: framesource.py
+Version: 1.0 [2026/10/16]
+
+Description:
+Frame sources for the PiPark Smart Parking Sensor. A frame source hands the
+detection loop one frame at a time through its frames() generator, so the
+loop does not need to know whether frames come from the PiCam, a directory of
+pictures, a recorded sequence or a synthetic generator. The source used is
+selected by the FRAME_SOURCE setting, see create_frame_source().
+
+A source may be given a region of interest (ROI), in which case it only
+returns that region of each frame. Where it can, the source avoids capturing
+or reading the rest of the frame at all.
+
+"""
+
+# -----------------------------------------------------------------------------
+#  Imports
+# -----------------------------------------------------------------------------
+# python
+import os
+
+# PiPark
+import data.settings as s
+import framepool
+import imageread
+import scheduler
+import timing
+from imageread import numpy
+
+# where still pictures are saved when CAPTURE_MODE is 'file'
+IMAGE_LOCATION = "./images/pipark.jpeg"
+
+# file extensions of the pictures read by DirectorySource
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif")
+
+
+# ==============================================================================
+#
+#   Frame Source Base Class
+#
+# ==============================================================================
+class FrameSource:
+    """
+    Base class of all frame sources. Subclasses implement capture(), which
+    returns the next frame, or None when there are no frames left.
+
+    Sources which capture into buffers of their own take them from a
+    framepool.FramePool, so that each frame can be used without copying it
+    until it is given back with release().
+
+    """
+
+    # normal seconds between frames, and the scheduler keeping that cadence
+    delay = 0
+    scheduler = None
+
+    # live sources, such as the camera, produce frames whether or not the
+    # previous ones have been processed. Recorded sources do not.
+    is_live = True
+
+    # (x, y, w, h) of the region of the picture to which frames are cropped,
+    # or None for whole frames
+    roi = None
+
+    # framepool.FramePool of the buffers frames are captured into, or None if
+    # every frame is newly created, e.g. decoded from a picture
+    pool = None
+
+    def __init__(self, delay = 0, roi = None):
+        self.delay = delay
+        self.roi = roi
+
+        # live sources slow down while the car park is quiet, whereas
+        # recordings are always replayed at the same rate
+        max_delay = delay
+        if self.is_live: max_delay = max(delay, s.MAX_PICTURE_DELAY)
+        self.scheduler = scheduler.TickScheduler(delay, max_delay)
+
+    def capture(self):
+        """Return the next frame, or None if the source is exhausted. """
+        raise NotImplementedError
+
+    def crop(self, frame):
+        """Return the ROI of a frame, given as a PIL image or NumPy array. """
+        if self.roi is None: return frame
+        x, y, w, h = self.roi
+
+        # a NumPy frame is cropped without copying it
+        if numpy is not None and isinstance(frame, numpy.ndarray):
+            return frame[y:y + h, x:x + w]
+
+        return frame.crop((x, y, x + w, y + h))
+
+    def release(self, frame):
+        """
+        Give a frame back to the source once it has been analysed. A pooled
+        frame's buffer is reused for a later frame, and a decoded picture's
+        memory is freed straight away rather than when it is collected.
+
+        """
+        if frame is None: return
+        if self.pool is not None and self.pool.release(frame): return
+
+        if not (numpy is not None and isinstance(frame, numpy.ndarray)) \
+                and hasattr(frame, "close"):
+            frame.close()
+
+    def getResolution(self):
+        """Return the (width, height) of the frames returned. """
+        return get_resolution(self.roi)
+
+    def frames(self):
+        """
+        Generator yielding frames until the source is exhausted. Frames are
+        captured on the cadence kept by the source's scheduler, i.e. every
+        'delay' seconds however long each takes, and less often while the
+        analysis reports that nothing is happening.
+
+        Each frame must be given back with release() once it has been used,
+        as a pooled source waits for a free buffer before capturing.
+
+        """
+        while True:
+            self.scheduler.wait()
+
+            # capture() times its own stages, so that reading the frame from
+            # the camera or source ("capture") is timed apart from any file
+            # write and decode, and waiting for a free buffer is not timed
+            frame = self.capture()
+            if frame is None: return
+
+            yield frame
+
+    def close(self):
+        """Release any resources held by the source. """
+        pass
+
+
+# ==============================================================================
+#
+#   PiCamera Still Capture
+#
+# ==============================================================================
+class PiCameraStill(FrameSource):
+    """
+    Take a still picture with the PiCam for every frame. Pictures are either
+    saved as a JPEG and loaded again, or captured straight into pooled
+    in-memory buffers. With an ROI the camera is zoomed in on it, so only the
+    ROI is captured, encoded and decoded.
+
+    """
+
+    camera = None
+    image_location = None
+
+    def __init__(self, camera, image_location = None, delay = 0, roi = None):
+        """
+        Keyword Arguments:
+        camera -- PiCamera object.
+        image_location -- Where to save each picture. If None the pictures
+            are captured into memory instead (requires NumPy).
+        delay -- Seconds between frames.
+        roi -- (x, y, w, h) of the region of the picture to capture.
+
+        """
+        FrameSource.__init__(self, delay, roi)
+        self.camera = camera
+        self.image_location = image_location
+
+        if roi is not None: imageread.set_camera_zoom(camera, roi)
+
+        if image_location is None:
+            resolution = self.getResolution()
+            self.pool = framepool.FramePool(
+                lambda: imageread.create_frame_buffer(resolution))
+
+    def capture(self):
+        # capture new frame straight into a buffer from the pool
+        if self.pool is not None:
+            buffer = self.pool.acquire()
+            try:
+                with timing.timed("capture"):
+                    return imageread.capture_frame(self.camera, buffer,
+                        self.getResolution())
+            except:
+                self.pool.release(buffer)
+                raise
+
+        # capture new image & save to specified location, at the size of the
+        # ROI when the camera is zoomed in on it
+        resize = None
+        if self.roi is not None: resize = self.getResolution()
+        with timing.timed("file write"):
+            self.camera.capture(self.image_location, resize = resize)
+        print "INFO: New image saved to:", self.image_location
+
+        try:
+            # load image for processing
+            with timing.timed("decode"):
+                image = imageread.Image.open(self.image_location)
+                image.load()
+        except Exception, err:
+            # raised rather than exiting, so that the capture stage is
+            # restarted by the supervisor
+            print "ERROR: The image has failed to load. Check camera setup. "
+            raise IOError("Cannot load " + self.image_location + ": "
+                + str(err))
+
+        return image
+
+    def close(self):
+        if self.roi is not None: imageread.set_camera_zoom(self.camera)
+
+
+# ==============================================================================
+#
+#   PiCamera Video-port Stream
+#
+# ==============================================================================
+class PiCameraStream(FrameSource):
+    """
+    Continuously capture frames from the PiCam's video port into pooled
+    in-memory buffers. Unlike still captures the camera does not have to switch
+    mode for every frame, so frames can be delivered several times a second.
+
+    """
+
+    camera = None
+    __output = None
+    __stream = None
+
+    def __init__(self, camera, frame_rate = None, roi = None):
+        """
+        Keyword Arguments:
+        camera -- PiCamera object.
+        frame_rate -- Frames per second delivered (default = FRAME_RATE).
+        roi -- (x, y, w, h) of the region of the picture to capture.
+
+        """
+        if frame_rate is None: frame_rate = s.FRAME_RATE
+        FrameSource.__init__(self, 1.0 / frame_rate, roi)
+
+        self.camera = camera
+        resolution = self.getResolution()
+        self.pool = framepool.FramePool(
+            lambda: imageread.create_frame_buffer(resolution))
+        self.__output = BufferOutput(None)
+
+        if roi is not None: imageread.set_camera_zoom(camera, roi)
+
+    def capture(self):
+        resolution = self.getResolution()
+
+        # start the continuous capture on the first frame, at the size of the
+        # ROI when the camera is zoomed in on it
+        if self.__stream is None:
+            resize = None
+            if self.roi is not None: resize = resolution
+            self.__stream = self.camera.capture_continuous(self.__output,
+                format = "rgb", use_video_port = True, resize = resize)
+
+        # each frame is written into a buffer from the pool
+        buffer = self.pool.acquire()
+        self.__output.rewind(buffer)
+        try:
+            with timing.timed("capture"):
+                self.__stream.next()
+        except StopIteration:
+            # a finished stream would otherwise silently end frames()
+            self.pool.release(buffer)
+            self.__closeStream()
+            raise IOError("The video-port stream has ended.")
+        except:
+            # the stream cannot be resumed once it has raised, so the next
+            # capture starts a new one
+            self.pool.release(buffer)
+            self.__closeStream()
+            raise
+
+        # strip the padding from the frame without copying it
+        width, height = imageread.get_padded_resolution(resolution)
+        frame = buffer.reshape((height, width, 3))
+        return frame[:resolution[1], :resolution[0]]
+
+    def close(self):
+        self.__closeStream()
+        if self.roi is not None: imageread.set_camera_zoom(self.camera)
+
+    def __closeStream(self):
+        """Stop the continuous capture, if it has been started. """
+        if self.__stream is None: return
+
+        stream = self.__stream
+        self.__stream = None
+        try:
+            stream.close()
+        except Exception:
+            pass
+
+
+# ==============================================================================
+#
+#   Directory of Pictures
+#
+# ==============================================================================
+class DirectorySource(FrameSource):
+    """
+    Read every picture in a directory, in order of file name. Useful for
+    testing detection against pictures taken earlier.
+
+    """
+
+    is_live = False
+
+    filenames = None
+    loop = False
+    __index = 0
+
+    def __init__(self, path, delay = 0, loop = False, roi = None):
+        """
+        Arguments:
+        path -- Directory containing the pictures.
+
+        Keyword Arguments:
+        delay -- Seconds between frames.
+        loop -- Start again from the first picture after the last one.
+        roi -- (x, y, w, h) of the region of the pictures to return.
+
+        Raises:
+        IOError -- When the directory contains no pictures.
+
+        """
+        FrameSource.__init__(self, delay, roi)
+        self.loop = loop
+
+        self.filenames = sorted(
+            os.path.join(path, filename) for filename in os.listdir(path)
+            if os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS
+            )
+
+        if not self.filenames:
+            raise IOError("No pictures found in " + path)
+
+    def capture(self):
+        if self.__index >= len(self.filenames):
+            if not self.loop: return None
+            self.__index = 0
+
+        filename = self.filenames[self.__index]
+        self.__index += 1
+
+        if s.IS_VERBOSE: print "INFO: Loading Image:", filename
+        with timing.timed("decode"):
+            image = imageread.Image.open(filename)
+            image.load()
+
+        return self.crop(image)
+
+
+# ==============================================================================
+#
+#   Recorded Sequence Replay
+#
+# ==============================================================================
+class ReplaySource(FrameSource):
+    """
+    Replay a recorded sequence of frames, such as a day of the car park. The
+    recording may be either:
+
+        - A numbered sequence of pictures, given as a pattern containing a
+          format field, e.g. './recording/frame%05d.jpeg'.
+        - A '.rgb' or '.raw' file of raw RGB frames at PICTURE_RESOLUTION, one
+          after the other, as written by the camera's 'rgb' format.
+        - A video file, which requires OpenCV.
+
+    With no delay the recording is replayed as fast as it can be processed.
+    With an ROI only the rows of the ROI are read from a raw file.
+
+    """
+
+    is_live = False
+
+    path = None
+    __index = 0
+    __file = None
+    __video = None
+
+    def __init__(self, path, delay = 0, roi = None):
+        """
+        Arguments:
+        path -- Pattern, raw file or video file of the recording.
+
+        Keyword Arguments:
+        delay -- Seconds between frames.
+        roi -- (x, y, w, h) of the region of the frames to return.
+
+        Raises:
+        IOError -- When the recording cannot be opened.
+
+        """
+        FrameSource.__init__(self, delay, roi)
+        self.path = path
+        extension = os.path.splitext(path)[1].lower()
+
+        if "%" in path:
+            # numbered sequence of pictures, starting at 0 or 1
+            if not os.path.exists(path % 0): self.__index = 1
+        elif extension in (".rgb", ".raw"):
+            self.__file = open(path, "rb")
+            shape = (self.getResolution()[1], s.PICTURE_RESOLUTION[0], 3)
+            self.pool = framepool.FramePool(
+                lambda: numpy.empty(shape, dtype = numpy.uint8))
+        else:
+            # OpenCV is only imported here, as it is large and only needed
+            # to replay videos
+            try:
+                import cv2
+            except ImportError:
+                print "ERROR: OpenCV needs to be installed to replay videos."
+                raise IOError("Cannot open video " + path)
+
+            self.__video = cv2.VideoCapture(path)
+            if not self.__video.isOpened():
+                raise IOError("Cannot open video " + path)
+
+    def capture(self):
+        # raw RGB frames, read straight into a buffer from the pool. Only the
+        # rows of the ROI are read, and the rest of the frame is skipped.
+        if self.__file is not None:
+            row_size = s.PICTURE_RESOLUTION[0] * 3
+            start = self.__file.tell()
+            if self.roi is not None: self.__file.seek(self.roi[1] * row_size, 1)
+
+            buffer = self.pool.acquire()
+            with timing.timed("capture"):
+                size = self.__file.readinto(buffer.data)
+            if size < buffer.nbytes:
+                self.pool.release(buffer)
+                return None
+
+            self.__file.seek(start + row_size * s.PICTURE_RESOLUTION[1])
+            if self.roi is None: return buffer
+            return buffer[:, self.roi[0]:self.roi[0] + self.roi[2]]
+
+        # video file, OpenCV decodes frames as BGR
+        if self.__video is not None:
+            with timing.timed("decode"):
+                is_read, frame = self.__video.read()
+            if not is_read: return None
+            return self.crop(frame[:, :, ::-1])
+
+        # numbered sequence of pictures
+        filename = self.path % self.__index
+        if not os.path.exists(filename): return None
+        self.__index += 1
+
+        with timing.timed("decode"):
+            image = imageread.Image.open(filename)
+            image.load()
+
+        return self.crop(image)
+
+    def close(self):
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+        if self.__video is not None:
+            self.__video.release()
+            self.__video = None
+
+
+# ==============================================================================
+#
+#   Buffer Output
+#
+# ==============================================================================
+class BufferOutput:
+    """
+    File-like object that writes camera output into a frame buffer. The
+    camera writes each frame sequentially, so the output must be rewound
+    before each frame, optionally onto a different buffer.
+
+    """
+
+    buffer = None
+    position = 0
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+    def write(self, data):
+        size = len(data)
+        self.buffer[self.position:self.position + size] = numpy.frombuffer(
+            data, dtype = numpy.uint8)
+        self.position += size
+        return size
+
+    def flush(self):
+        pass
+
+    def rewind(self, buffer = None):
+        if buffer is not None: self.buffer = buffer
+        self.position = 0
+
+
+# ==============================================================================
+#
+#   Synthetic Frame Generator
+#
+# ==============================================================================
+class SyntheticSource(FrameSource):
+    """
+    Generate frames of an empty car park in which cars randomly arrive at and
+    leave the parking spaces. Stands in for the camera on machines without one.
+
+    """
+
+    change_rate = 0.05
+    noise = 8
+
+    __random = None
+    __noise = None
+    __spaces = None
+    __occupied = None
+
+    def __init__(self, boxes, resolution = None, delay = 0, change_rate = 0.05,
+            noise = 8, seed = None, roi = None):
+        """
+        Arguments:
+        boxes -- Box data, as saved in setup_data.py.
+
+        Keyword Arguments:
+        resolution -- (width, height) of the frames (default =
+            PICTURE_RESOLUTION).
+        delay -- Seconds between frames.
+        change_rate -- Chance of each space changing status in a frame.
+        noise -- Maximum brightness of the random noise added to each pixel.
+        seed -- Seed of the random number generator.
+        roi -- (x, y, w, h) of the region of the car park to generate. The
+            resolution is then the size of the ROI.
+
+        """
+        FrameSource.__init__(self, delay, roi)
+        if resolution is None: resolution = s.PICTURE_RESOLUTION
+
+        # only the ROI is generated, so move the spaces relative to it
+        x0, y0 = 0, 0
+        if roi is not None:
+            x0, y0 = roi[0], roi[1]
+            resolution = self.getResolution()
+
+        self.change_rate = change_rate
+        self.noise = noise
+        shape = (resolution[1], resolution[0], 3)
+        self.pool = framepool.FramePool(
+            lambda: numpy.empty(shape, dtype = numpy.uint8))
+        self.__random = numpy.random.RandomState(seed)
+
+        # noise for two frames' worth of pixels, drawn once. Each frame adds
+        # a window of it starting at a random offset, rather than drawing
+        # new noise into a new array every frame.
+        if noise > 0:
+            size = shape[0] * shape[1] * shape[2]
+            self.__noise = self.__random.randint(0, noise, 2 * size,
+                dtype = numpy.uint8)
+
+        # (x1, y1, x2, y2) of every parking space
+        self.__spaces = [
+            (max(0, min(box[2], box[4]) - x0), max(0, min(box[3], box[5]) - y0),
+                max(0, max(box[2], box[4]) - x0),
+                max(0, max(box[3], box[5]) - y0))
+            for box in boxes if box[1] == 0
+            ]
+        self.__occupied = [False for space in self.__spaces]
+
+    def capture(self):
+        frame = self.pool.acquire()
+
+        with timing.timed("capture"):
+            # grey tarmac with some sensor noise
+            frame[:] = 100
+            if self.__noise is not None:
+                size = frame.size
+                offset = self.__random.randint(0, len(self.__noise) - size + 1)
+                frame += self.__noise[offset:offset + size].reshape(frame.shape)
+
+            # randomly park or remove cars, then draw them
+            for i, (x1, y1, x2, y2) in enumerate(self.__spaces):
+                if self.__random.random_sample() < self.change_rate:
+                    self.__occupied[i] = not self.__occupied[i]
+
+                if self.__occupied[i]: frame[y1:y2, x1:x2] = (180, 30, 30)
+
+        return frame
+
+
+# -----------------------------------------------------------------------------
+#  Get Resolution
+# -----------------------------------------------------------------------------
+def get_resolution(roi = None):
+    """
+    Return the (width, height) of the frames returned by a frame source,
+    i.e. PICTURE_RESOLUTION or the size of the ROI.
+
+    Keyword Arguments:
+    roi -- (x, y, w, h) of the region of the frames returned, if any.
+
+    """
+    if roi is None: return tuple(s.PICTURE_RESOLUTION)
+    return (roi[2], roi[3])
+
+
+# -----------------------------------------------------------------------------
+#  Create Frame Source
+# -----------------------------------------------------------------------------
+def create_frame_source(camera = None, boxes = None, source = None,
+        path = None, roi = None):
+    """
+    Create the frame source selected by FRAME_SOURCE, or by source if given:
+
+        picamera -- The PiCam, captured according to CAPTURE_MODE.
+        directory -- The pictures in the directory FRAME_SOURCE_PATH.
+        replay -- The recording at FRAME_SOURCE_PATH, see ReplaySource.
+        synthetic -- Generated frames of cars parking in the boxes.
+
+    The camera modes are chosen by CAPTURE_MODE:
+
+        file -- Still pictures saved to IMAGE_LOCATION and loaded again.
+        memory -- Still pictures captured into an in-memory buffer.
+        stream -- Continuous capture from the camera's video port, at
+            FRAME_RATE frames per second.
+
+    All sources other than 'stream' wait PICTURE_DELAY seconds after each
+    frame. The in-memory modes and the synthetic and raw replay sources
+    require NumPy; without it the camera falls back to file mode.
+
+    If an ROI is given every source returns only that region of its frames,
+    and the camera is zoomed in on it.
+
+    Keyword Arguments:
+    camera -- PiCamera object, from imageread.setup_camera().
+    boxes -- Box data, as saved in setup_data.py.
+    source -- The frame source (default = FRAME_SOURCE).
+    path -- The path of the frame source (default = FRAME_SOURCE_PATH).
+    roi -- (x, y, w, h) of the region of the frames to return, e.g. from
+        boxstore.get_bounding_box().
+
+    Raises:
+    ValueError -- When the frame source is not recognised.
+
+    """
+    if source is None: source = s.FRAME_SOURCE
+    if path is None: path = s.FRAME_SOURCE_PATH
+    if s.IS_VERBOSE: print "INFO: Frame source:", source
+
+    if source == "directory":
+        return DirectorySource(path, delay = s.PICTURE_DELAY, roi = roi)
+    elif source == "replay":
+        return ReplaySource(path, delay = s.PICTURE_DELAY, roi = roi)
+    elif source == "synthetic":
+        return SyntheticSource(boxes, delay = s.PICTURE_DELAY, roi = roi)
+    elif source != "picamera":
+        raise ValueError("Unknown frame source: " + str(source))
+
+    mode = s.CAPTURE_MODE
+
+    if mode in ("memory", "stream") and numpy is None:
+        print "ERROR: Capture mode", mode, "requires NumPy. Saving to file."
+        mode = "file"
+
+    if mode == "stream":
+        if s.IS_VERBOSE: print "INFO: Streaming frames from the video port."
+        return PiCameraStream(camera, roi = roi)
+    elif mode == "memory":
+        if s.IS_VERBOSE: print "INFO: Capturing frames into memory."
+        return PiCameraStill(camera, delay = s.PICTURE_DELAY, roi = roi)
+    else:
+        return PiCameraStill(camera, IMAGE_LOCATION, delay = s.PICTURE_DELAY,
+            roi = roi)
@@ -0,0 +1,287 @@
+"""
+Author: agent (MainApplication by Nicholas Sanders & Humphrey Shotton)
+Filename: gui.py
+Version: 1.0 [2026/10/16]
+
+Description:
+Tkinter application shown by main.py while PiPark is running, showing how
+many parking spaces are available and the camera preview. Only imported when
+PiPark is run with its GUI, so that headless units never load Tkinter.
+
+Tkinter may only be used from the thread running its mainloop(). Other
+threads ask the application to do things through post(), which queues the
+request for the Tkinter thread to carry out.
+
+"""
+
+# -----------------------------------------------------------------------------
+#  Imports
+# -----------------------------------------------------------------------------
+# python
+import Queue
+import Tkinter as tk
+import tkMessageBox
+
+from PIL import Image, ImageTk
+
+# PiPark
+import data.settings as s
+import timing
+
+# milliseconds between checks for requests from other threads
+POLL_INTERVAL = 100
+
+# ==============================================================================
+#
+#       Tkinter Application
+#
+# ==============================================================================
+class MainApplication(tk.Frame):
+    # ------------------------------------------------------------------------------
+    #  Instance Attributes
+    # ------------------------------------------------------------------------------
+    
+    # output messages to the terminal?
+    __is_verbose = s.IS_VERBOSE
+    
+    # pi camera
+    __camera = None
+    __preview_is_active = False
+    
+    __label = None
+    __label_item = None
+    __on_quit = None
+    __requests = None
+    __is_closed = False
+    
+    # --------------------------------------------------------------------------
+    #  Constructor Method
+    # --------------------------------------------------------------------------
+    def __init__(self, master = None, camera = None, on_quit = None):
+        """
+        Application constructor method.
+        
+        Keyword Arguments:
+        master -- The Tkinter root window.
+        camera -- PiCamera to preview, or None if frames are not taken from
+            the camera.
+        on_quit -- Function called when 'Quit' is clicked, which should close
+            the application. If None the application is closed straight away.
+        
+        """
+        if self.__is_verbose: print "INFO: Application constructor called."
+
+        # run super constructor method
+        tk.Frame.__init__(self, master)
+        
+        # apply grid layout
+        self.grid()
+        
+        # give application a reference to the camera object, if frames are
+        # taken from the camera
+        self.__camera = camera
+        self.__on_quit = on_quit
+        if self.__camera:
+            self.__camera.awb_mode = 'auto'
+            self.__camera.exposure_mode = 'auto'
+        
+        # populate the application WITH W-W-W-WWIDDDDGEETTSS
+        self.__createWidgets()
+        
+        # create canvas to display logo, loaded once, with the text over it
+        self.logo = tk.Canvas(self, width = 400, height = 148)
+        self.logo.grid(row = 0, column = 0, rowspan = 1, columnspan = 2)
+        self.loadImage("./images/logo_main.jpeg", self.logo, 400/2, 148/2)
+        self.__label_item = self.logo.create_text((200, 130), fill = "white")
+        self.updateText()
+        
+        # carry out requests from other threads, see post()
+        self.__requests = Queue.Queue()
+        self.after(POLL_INTERVAL, self.__processRequests)
+        
+        # create key-press handlers -> set focus to this frame
+        self.bind("<Escape>", self.escapePressHandler)
+        self.focus_set()
+    
+    def updateText(self, occupied = 0, num_spaces = 0):
+        """
+        Show the number of occupied spaces under the logo. The text is only
+        changed when the numbers have. Must be called from the Tkinter thread,
+        see showCounts().
+        
+        Keyword Arguments:
+        occupied -- Number of occupied spaces.
+        num_spaces -- Number of spaces whose status is known.
+        
+        """
+        label = "Parking Spaces Available:", occupied, "/", num_spaces
+        if label == self.__label: return
+        
+        self.__label = label
+        self.logo.itemconfigure(self.__label_item, text = label)
+    
+    # --------------------------------------------------------------------------
+    #  Requests From Other Threads
+    # --------------------------------------------------------------------------
+    def post(self, function, *args):
+        """
+        Call function(*args) from the Tkinter thread, within POLL_INTERVAL
+        milliseconds. Safe to call from any thread.
+        
+        """
+        self.__requests.put((function, args))
+    
+    def showCounts(self, occupied, num_spaces):
+        """Show the number of occupied spaces. Safe to call from any thread. """
+        self.post(self.updateText, occupied, num_spaces)
+    
+    def __processRequests(self):
+        """Carry out every waiting request, then check again later. """
+        while not self.__is_closed:
+            try:
+                function, args = self.__requests.get_nowait()
+            except Queue.Empty:
+                break
+            
+            # time the request and the redrawing it causes as the "tk update"
+            with timing.timed("tk update"):
+                function(*args)
+                self.update_idletasks()
+        
+        if not self.__is_closed:
+            self.after(POLL_INTERVAL, self.__processRequests)
+        
+    # --------------------------------------------------------------------------
+    #  Key Event Handlers
+    # --------------------------------------------------------------------------
+    def escapePressHandler(self, event):
+        """Handle ESCAPE key events. """
+        
+        if self.__is_verbose: print "ACTION: ESCAPE key pressed."
+        
+        
+        # if the camera is previewing -> stop the preview
+        if self.__camera and self.__preview_is_active:
+            self.__camera.stop_preview()
+            self.__preview_is_active = False
+            if self.__is_verbose: print "INFO: Camera preview stopped. "
+            
+            # reset focus to application frame
+            self.focus_set()
+    
+    # --------------------------------------------------------------------------
+    #  Button Press Events
+    # --------------------------------------------------------------------------
+    def clickStartPreview(self):
+        """Handle 'Start Preview' button click events. """
+        if self.__is_verbose: print "ACTION: 'Start Preview' clicked! "
+        
+        # turn on the camera preview
+        if self.__camera and not self.__preview_is_active:
+            
+            tkMessageBox.showinfo(
+                title = "Show Camera Feed",
+                message = "Press the ESCAPE key to exit preview mode"
+                )
+
+            #self.__camera.brightness = 70;
+            #self.__camera.awb_mode = 'auto';
+            
+            self.__camera.start_preview()
+            self.__preview_is_active = True
+            if self.__is_verbose: print "INFO: Camera preview started. "
+            
+            # reset focus to the application frame
+            self.focus_set()
+    
+    
+    def clickQuit(self):
+        """Handle 'Quit' button click events. """
+        
+        # trigger exit of program, which also closes the application
+        if self.__on_quit is not None: self.__on_quit()
+        else: self.close()
+    
+    def close(self):
+        """Close the application, ending its mainloop(). """
+        self.__is_closed = True
+        self.quit()
+        self.master.destroy()
+    
+    # --------------------------------------------------------------------------
+    #  Create Widgets
+    # --------------------------------------------------------------------------
+    def __createWidgets(self):
+        """Create the widgets. """
+        if self.__is_verbose: print "INFO: Creating Widgets!"
+        
+        # create show preview button
+        self.preview_button = tk.Button(self, text = "Show Camera Feed",
+            command = self.clickStartPreview)
+        self.preview_button.grid(row = 1, column = 0, 
+            sticky = tk.W + tk.E + tk.N + tk.S)
+        
+        # create quit button
+        self.quit_button = tk.Button(self, text = "Quit",
+            command = self.clickQuit)
+        self.quit_button.grid(row = 1, column = 1, 
+            sticky = tk.W + tk.E + tk.N + tk.S)
+    
+    # --------------------------------------------------------------------------
+    #   Load Image
+    # --------------------------------------------------------------------------
+    def loadImage(self, image_address, canvas, width, height):
+        """
+        Load image at image_address. If the load is successful then return True,
+        otherwise return False.
+        
+        Keyword Arguments:
+        image_address -- The address of the image to be loaded (default = './').
+        canvas -- The Tkinter Canvas into which the image is loaded.
+        width -- Width of the image to load.
+        height -- Height of the image to load.
+        
+        Returns:
+        Boolean -- True if load successful, False if not.
+        
+        """
+        # clear the old canvas
+        canvas.delete(tk.ALL)
+        
+        if self.__is_verbose:
+            print "INFO: Tkinter Canvas cleared. Read to load new image. "
+        
+        try:
+            # guard against incorrect argument datatypes
+            if not isinstance(canvas, tk.Canvas): raise TypeError
+            if not isinstance(image_address, str): raise TypeError
+            if not isinstance(width, int): raise TypeError
+            if not isinstance(height, int): raise TypeError
+            
+            # load the image into the canvas
+            photo = ImageTk.PhotoImage(Image.open(image_address))
+            canvas.create_image((width, height), image = photo)
+            canvas.image = photo
+            
+            # image load successful
+            return True
+        
+        except TypeError:
+            # arguments of incorrect data type, load unsuccessful
+            if self.__is_verbose: 
+                print "ERROR: loadImage() arguments of incorrect data type."
+            return False
+        except:
+            # image failed to load
+            if self.__is_verbose: 
+                print "ERROR: loadImage() failed to load image " + image_address
+            return False
+            
+    
+    # --------------------------------------------------------------------------
+    #  Getter(s)
+    # --------------------------------------------------------------------------
+    # is verbose
+    def getIsVerbose():
+        """Retrun boolean whether application is verbose or not. """
+        return self.__is_verbose
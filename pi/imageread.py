@@ -18,11 +18,12 @@ import time
 # PiPark
 import data.settings as s
     
+# PiCamera, only needed when frames are taken from the camera (FRAME_SOURCE is
+# 'picamera'). Other frame sources work without it, e.g. on a desktop PC.
 try: 
     import picamera
 except ImportError:
-    print "ERROR: PiCamera Module needs to be installed."
-    sys.exit()
+    picamera = None
 
 # Pythonware, Image Library
 try:
@@ -31,24 +32,44 @@ except ImportError:
     print "ERROR: Python Image Library needs to be installed."
     sys.exit()
 
+# NumPy, used by the vectorised averaging engine. If it is not installed the
+# pure-Python get_area_average() loop is used instead.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 # -----------------------------------------------------------------------------
 #  Setup Camera
 # -----------------------------------------------------------------------------
-def setup_camera(is_fullscreen = True):
+def setup_camera(is_fullscreen = True, camera_num = 0, source = None):
     """
     Setup the PiCam to default PiPark settings, and return the camera as
-    an object.
+    an object. If the frame source is not 'picamera' no camera is needed, and
+    None is returned instead.
     
     Keyword Arguments:
     is_fullscreen -- Boolean value. True for fullscreen, false for window.
+    camera_num -- Which PiCam to use, on boards with more than one.
+    source -- The frame source (default = FRAME_SOURCE).
+    
+    Raises:
+    ImportError -- When the PiCamera module is not installed.
     
     """
     
+    if source is None: source = s.FRAME_SOURCE
+    if source != "picamera": return None
+    
+    if picamera is None:
+        print "ERROR: PiCamera Module needs to be installed."
+        raise ImportError("No module named picamera")
+    
     # ensure that camera is correctly installed and set it up to output to a
     # window and turn off AWB and exposure modes. If camera does not exist
     # print error message and quit program.
-    camera = picamera.PiCamera()
+    camera = picamera.PiCamera(camera_num = camera_num)
     camera.resolution = s.PICTURE_RESOLUTION
     camera.preview_fullscreen = is_fullscreen
     camera.awb_mode = "off"
@@ -58,6 +79,90 @@ def setup_camera(is_fullscreen = True):
     
     return camera
 
+
+def set_camera_zoom(camera, roi = None):
+    """
+    Zoom the PiCam in on a region of the picture, so that only that region is
+    captured. Captures should then be resized to the size of the region, so
+    that each pixel is the same size as in a full picture.
+    
+    Arguments:
+    camera -- PiCamera object.
+    
+    Keyword Arguments:
+    roi -- (x, y, w, h) of the region, in pixels of PICTURE_RESOLUTION. If
+        None, the zoom is reset to the whole picture.
+    
+    """
+    if roi is None:
+        camera.zoom = (0.0, 0.0, 1.0, 1.0)
+        return
+    
+    width = float(s.PICTURE_RESOLUTION[0])
+    height = float(s.PICTURE_RESOLUTION[1])
+    camera.zoom = (roi[0] / width, roi[1] / height,
+        roi[2] / width, roi[3] / height)
+
+# -----------------------------------------------------------------------------
+#  In-memory Capture
+# -----------------------------------------------------------------------------
+def get_padded_resolution(resolution = None):
+    """
+    Return the (width, height) of a raw capture. The camera pads raw frames to
+    a multiple of 32 pixels wide and 16 pixels high.
+    
+    Keyword Arguments:
+    resolution -- (width, height) of the picture (default = PICTURE_RESOLUTION).
+    
+    """
+    if resolution is None: resolution = s.PICTURE_RESOLUTION
+    
+    return ((resolution[0] + 31) // 32 * 32, (resolution[1] + 15) // 16 * 16)
+
+
+def create_frame_buffer(resolution = None):
+    """
+    Allocate a buffer large enough to hold one raw RGB capture. Buffers are
+    created once, and reused for later captures (see framepool.py).
+    
+    Keyword Arguments:
+    resolution -- (width, height) of the picture (default = PICTURE_RESOLUTION).
+    
+    """
+    width, height = get_padded_resolution(resolution)
+    return numpy.empty(width * height * 3, dtype = numpy.uint8)
+
+
+def capture_frame(camera, buffer, resolution = None):
+    """
+    Capture a raw RGB frame into an existing buffer, without encoding a JPEG
+    or writing to the SD card.
+    
+    Arguments:
+    camera -- PiCamera object.
+    buffer -- Buffer returned by create_frame_buffer().
+    
+    Keyword Arguments:
+    resolution -- (width, height) of the picture (default = PICTURE_RESOLUTION).
+    
+    Return:
+    frame -- NumPy array view of the buffer, of shape (height, width, 3).
+    
+    """
+    if resolution is None: resolution = s.PICTURE_RESOLUTION
+    width, height = get_padded_resolution(resolution)
+    
+    # resize the picture if it is not at the camera's resolution, e.g. when
+    # the camera is zoomed in on a region
+    resize = None
+    if list(resolution) != list(camera.resolution): resize = tuple(resolution)
+    
+    camera.capture(buffer, format = "rgb", resize = resize)
+    
+    # strip the padding from the frame without copying it
+    return buffer.reshape((height, width, 3))[:resolution[1], :resolution[0]]
+
+
 # -----------------------------------------------------------------------------
 #  Load Image
 # -----------------------------------------------------------------------------
@@ -128,6 +233,302 @@ def get_area_average(pixels, x, y, w, h):
     return totals
 
 
+# -----------------------------------------------------------------------------
+#  Get Image Array
+# -----------------------------------------------------------------------------
+def get_image_array(image):
+    """
+    Convert a PIL image into a NumPy array of its RGB values. The array is
+    indexed as [y, x, channel], i.e. rows first.
+    
+    Arguments:
+    image -- PIL image of the captured frame.
+    
+    Return:
+    array -- NumPy array of shape (height, width, 3).
+    
+    """
+    
+    if image.mode != "RGB": image = image.convert("RGB")
+    return numpy.asarray(image)
+
+
+# -----------------------------------------------------------------------------
+#  Reduce Frame
+# -----------------------------------------------------------------------------
+def reduce_frame(image, factor):
+    """
+    Downsample a frame by keeping every factor'th pixel of every factor'th
+    row, starting from the top left corner. For a NumPy frame the result is a
+    view of the frame, so no pixels are copied.
+    
+    Arguments:
+    image -- PIL image or NumPy array of the frame.
+    factor -- Decimation factor. 1 returns the frame unchanged.
+    
+    Return:
+    frame -- The downsampled frame, of size ceil(width / factor) by
+        ceil(height / factor). A NumPy array if NumPy is installed, otherwise
+        a PIL image.
+    
+    """
+    if factor <= 1: return image
+    
+    if numpy is not None:
+        frame = image
+        if not isinstance(frame, numpy.ndarray): frame = get_image_array(image)
+        return frame[::factor, ::factor]
+    
+    return image.resize(get_reduced_resolution(image.size, factor),
+        Image.NEAREST)
+
+
+# -----------------------------------------------------------------------------
+#  Get Reduced Resolution
+# -----------------------------------------------------------------------------
+def get_reduced_resolution(resolution, factor):
+    """
+    Return the (width, height) of a frame of a resolution once downsampled by
+    reduce_frame(), i.e. rounded up after dividing by the factor.
+    
+    """
+    width, height = resolution
+    factor = max(1, factor)
+    return ((width + factor - 1) // factor, (height + factor - 1) // factor)
+
+
+# -----------------------------------------------------------------------------
+#  Integral Image
+# -----------------------------------------------------------------------------
+class IntegralImage:
+    """
+    Summed-area table of a captured frame. The table is built once per frame,
+    after which the RGB totals and averages of any (x, y, w, h) area can be
+    found in constant time, however large the area is or however many areas
+    overlap. The same table is rebuilt in place by update() for each new
+    frame of the same size, so none is allocated per frame.
+    
+    """
+    
+    # summed-area table of shape (height + 1, width + 1, 3). table[y, x] holds
+    # the RGB totals of every pixel above and to the left of (x, y).
+    table = None
+    
+    def __init__(self, image = None, resolution = None):
+        """
+        Build the summed-area table of a frame, or only allocate the table
+        for frames of a resolution, to be built later by update().
+        
+        Keyword Arguments:
+        image -- PIL image, or NumPy array from get_image_array().
+        resolution -- (width, height) of the frames.
+        
+        """
+        if resolution is not None:
+            self.table = numpy.zeros((resolution[1] + 1, resolution[0] + 1, 3),
+                dtype = numpy.int64)
+        if image is not None: self.update(image)
+    
+    def update(self, image):
+        """
+        Rebuild the summed-area table for a new frame, reusing the table if
+        the frame is the same size as the last.
+        
+        Arguments:
+        image -- PIL image, or NumPy array from get_image_array().
+        
+        """
+        frame = image
+        if not isinstance(frame, numpy.ndarray): frame = get_image_array(image)
+        
+        height, width = frame.shape[:2]
+        if self.table is None or self.table.shape[:2] != (height + 1, width + 1):
+            self.table = numpy.zeros((height + 1, width + 1, 3),
+                dtype = numpy.int64)
+        
+        # the first row and column stay zero, and the rest are overwritten
+        numpy.cumsum(frame[:, :, :3], axis = 0, dtype = numpy.int64,
+            out = self.table[1:, 1:])
+        numpy.cumsum(self.table[1:, 1:], axis = 1, out = self.table[1:, 1:])
+    
+    def getSize(self):
+        """Return the (width, height) of the frame. """
+        return (self.table.shape[1] - 1, self.table.shape[0] - 1)
+    
+    def getSum(self, x, y, w, h):
+        """
+        Return the [R, G, B] totals of an area as a list.
+        
+        Arguments:
+        x -- Starting x co-ordinate of area.
+        y -- Starting y co-ordinate of area.
+        w -- Width of area.
+        h -- Height of area.
+        
+        """
+        return self.getSums([(x, y, w, h)])[0].tolist()
+    
+    def getMean(self, x, y, w, h):
+        """
+        Return the average RGB values of an area, in the same format and with
+        the same integer division as get_area_average().
+        
+        Arguments:
+        x -- Starting x co-ordinate of area.
+        y -- Starting y co-ordinate of area.
+        w -- Width of area.
+        h -- Height of area.
+        
+        """
+        return self.getMeans([(x, y, w, h)])[0]
+    
+    def getSums(self, areas):
+        """
+        Return the RGB totals of many areas at once.
+        
+        Arguments:
+        areas -- List of (x, y, w, h) tuples, one for each area.
+        
+        Returns:
+        totals -- NumPy array of shape (len(areas), 3).
+        
+        """
+        areas = numpy.asarray(areas, dtype = numpy.int64).reshape(-1, 4)
+        width, height = self.getSize()
+        
+        # corners of each area, clipped to the edges of the frame
+        x1 = numpy.clip(areas[:, 0], 0, width)
+        y1 = numpy.clip(areas[:, 1], 0, height)
+        x2 = numpy.clip(areas[:, 0] + areas[:, 2], 0, width)
+        y2 = numpy.clip(areas[:, 1] + areas[:, 3], 0, height)
+        
+        table = self.table
+        return table[y2, x2] - table[y1, x2] - table[y2, x1] + table[y1, x1]
+    
+    def getMeans(self, areas, as_array = False):
+        """
+        Return the average RGB values of many areas at once.
+        
+        Arguments:
+        areas -- List of (x, y, w, h) tuples, one for each area.
+        
+        Keyword Arguments:
+        as_array -- Return a NumPy array of shape (len(areas), 4) rather than
+            a list.
+        
+        Returns:
+        averages -- List of [R, G, B, average] lists, one for each area.
+        
+        """
+        if not len(areas) and not as_array: return []
+        
+        areas = numpy.asarray(areas, dtype = numpy.int64).reshape(-1, 4)
+        return get_means(self.getSums(areas), areas, as_array)
+
+
+# -----------------------------------------------------------------------------
+#  Get Area Sums
+# -----------------------------------------------------------------------------
+def get_area_sums(frame, areas):
+    """
+    Return the RGB totals of several areas by adding up their pixels. Unlike
+    an IntegralImage this only reads the pixels of the areas, so it is the
+    cheaper of the two when the areas cover less than the whole frame.
+    
+    Arguments:
+    frame -- NumPy array of the frame.
+    areas -- NumPy array of (x, y, w, h) rows, one for each area.
+    
+    Returns:
+    totals -- NumPy array of shape (len(areas), 3), clipped to the frame in
+        the same way as IntegralImage.getSums().
+    
+    """
+    totals = numpy.zeros((len(areas), 3), dtype = numpy.int64)
+    
+    for i, (x, y, w, h) in enumerate(areas):
+        region = frame[max(0, y):max(0, y + h), max(0, x):max(0, x + w), :3]
+        totals[i] = region.sum(axis = (0, 1), dtype = numpy.int64)
+    
+    return totals
+
+
+# -----------------------------------------------------------------------------
+#  Get Means
+# -----------------------------------------------------------------------------
+def get_means(totals, areas, as_array = False):
+    """
+    Turn the RGB totals of several areas into their averages, with the same
+    integer division as get_area_average().
+    
+    Arguments:
+    totals -- NumPy array of the [R, G, B] totals of each area.
+    areas -- NumPy array of the (x, y, w, h) of each area.
+    
+    Keyword Arguments:
+    as_array -- Return a NumPy array of shape (len(areas), 4) rather than
+        a list.
+    
+    Returns:
+    averages -- List of [R, G, B, average] lists, one for each area.
+    
+    """
+    num_pixels = areas[:, 2] * areas[:, 3]
+    
+    # integer division of every area total by its number of pixels, then
+    # the average of all three colours as the last column
+    means = totals // num_pixels[:, numpy.newaxis]
+    averages = numpy.empty((len(areas), 4), dtype = numpy.int64)
+    averages[:, :3] = means
+    averages[:, 3] = means.sum(axis = 1) // 3
+    
+    if as_array: return averages
+    return averages.tolist()
+
+
+# -----------------------------------------------------------------------------
+#  Get Area Averages
+# -----------------------------------------------------------------------------
+def get_area_averages(image, areas, as_array = False, integral = None):
+    """
+    Calculate the average RGB values of several areas of the same picture.
+    An IntegralImage is built once for the picture, so each area then costs
+    the same to average regardless of its size.
+    
+    The results are identical to calling get_area_average() for each area,
+    including the integer division of the totals.
+    
+    Arguments:
+    image -- PIL image or NumPy array of the captured frame.
+    areas -- List of (x, y, w, h) tuples, or NumPy array of shape (n, 4),
+        one row for each area.
+    
+    Keyword Arguments:
+    as_array -- Return the averages as a NumPy array of shape (n, 4) rather
+        than a list, e.g. for compare_areas(). Ignored without NumPy.
+    integral -- IntegralImage whose table is rebuilt for the picture, so that
+        one table can be reused for every frame. Ignored without NumPy.
+    
+    Return:
+    averages -- List of [R, G, B, average] lists, one for each area.
+    
+    """
+    
+    # fall back to the per-pixel loop if NumPy is not installed
+    if numpy is None:
+        pixels = image.load()
+        return [get_area_average(pixels, x, y, w, h) for x, y, w, h in areas]
+    
+    if not len(areas):
+        if as_array: return numpy.empty((0, 4), dtype = numpy.int64)
+        return []
+    
+    if integral is None: return IntegralImage(image).getMeans(areas, as_array)
+    
+    integral.update(image)
+    return integral.getMeans(areas, as_array)
+
+
 # -----------------------------------------------------------------------------
 #  Compare Area
 # -----------------------------------------------------------------------------
@@ -163,6 +564,114 @@ def compare_area(test, expected):
     return is_different
 
 
+# -----------------------------------------------------------------------------
+#  Compare Areas
+# -----------------------------------------------------------------------------
+def compare_areas(space_averages, control_averages, threshold = None,
+        with_margins = False):
+    """
+    Compare the average RGB values of every parking space with those of every
+    control point at once. Each pair is compared as by compare_area(), i.e.
+    they differ if any of their values differ by more than the threshold, and
+    a space is occupied if it differs from a majority of the control points.
+    
+    Arguments:
+    space_averages -- Average RGB values of each space, as a list of lists
+        or NumPy array of shape (num spaces, 4) from get_area_averages().
+    control_averages -- Average RGB values of each control point, likewise.
+    
+    Keyword Arguments:
+    threshold -- Largest difference in a value that is not a difference
+        (default = IMAGE_THRESHOLD).
+    with_margins -- Also return the margin of each space.
+    
+    Returns:
+    (differences, votes, is_occupied) -- Tuple of NumPy arrays:
+        differences -- Boolean matrix of shape (num spaces, num controls),
+            True where the space differs from the control point.
+        votes -- Number of control points each space differs from.
+        is_occupied -- Boolean decision for each space.
+        margins -- Only if with_margins. How close each space came to the
+            threshold, i.e. the smallest distance between the threshold and
+            the largest difference in a value from any control point.
+        Without NumPy these are lists.
+    
+    """
+    if threshold is None: threshold = s.IMAGE_THRESHOLD
+    num_controls = len(control_averages)
+    
+    # fall back to comparing each pair in turn if NumPy is not installed
+    if numpy is None:
+        differences = [
+            [compare_area(list(space), list(control))
+                for control in control_averages]
+            for space in space_averages
+            ]
+        votes = [row.count(True) for row in differences]
+        is_occupied = [2 * num > num_controls for num in votes]
+        if not with_margins: return differences, votes, is_occupied
+        
+        margins = [
+            min(abs(max(abs(a - b) for a, b in zip(space, control)) - threshold)
+                for control in control_averages)
+            for space in space_averages
+            ]
+        return differences, votes, is_occupied, margins
+    
+    spaces = numpy.asarray(space_averages, dtype = numpy.int16).reshape(-1, 4)
+    controls = numpy.asarray(control_averages,
+        dtype = numpy.int16).reshape(-1, 4)
+    
+    # difference of every value of every (space, control point) pair, by
+    # broadcasting to shape (num spaces, num controls, 4)
+    deltas = numpy.abs(spaces[:, numpy.newaxis, :]
+        - controls[numpy.newaxis, :, :])
+    differences = (deltas > threshold).any(axis = 2)
+    votes = differences.sum(axis = 1)
+    is_occupied = 2 * votes > num_controls
+    if not with_margins: return differences, votes, is_occupied
+    
+    margins = numpy.abs(deltas.max(axis = 2) - threshold).min(axis = 1)
+    return differences, votes, is_occupied, margins
+
+
+# -----------------------------------------------------------------------------
+#  Get Divergence
+# -----------------------------------------------------------------------------
+def get_divergence(full_averages, reduced_averages, num_spaces):
+    """
+    Measure how far the results of analysing a downsampled frame are from
+    those of analysing the full frame.
+    
+    Arguments:
+    full_averages -- Averages of every space and then every control point,
+        from get_area_averages() of the full frame.
+    reduced_averages -- Averages of the same boxes in the downsampled frame.
+    num_spaces -- Number of spaces, i.e. the first averages.
+    
+    Returns:
+    (max_difference, mean_difference, num_disagreeing) -- Largest and mean
+        absolute difference of any average value, and the number of spaces
+        found occupied in one frame but empty in the other.
+    
+    """
+    full_decisions = compare_areas(full_averages[:num_spaces],
+        full_averages[num_spaces:])[2]
+    reduced_decisions = compare_areas(reduced_averages[:num_spaces],
+        reduced_averages[num_spaces:])[2]
+    num_disagreeing = sum(1 for full, reduced
+        in zip(full_decisions, reduced_decisions) if full != reduced)
+    
+    # difference of every value of every box
+    differences = [abs(int(full) - int(reduced))
+        for full_row, reduced_row in zip(full_averages, reduced_averages)
+        for full, reduced in zip(full_row, reduced_row)]
+    if not differences: return 0, 0.0, 0
+    
+    return (max(differences), sum(differences) / float(len(differences)),
+        num_disagreeing)
+
+
 # -----------------------------------------------------------------------------
 #  Test
 # -----------------------------------------------------------------------------   
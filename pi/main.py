@@ -7,18 +7,26 @@ Version: 2.1 [2014/03/27]
 Main application. Two threads are created, one to deal with GUI and inputs, and
 the other to handle the PiPark Smart Parking System detection software.
 
+Run with --headless (or with HEADLESS set) on units without a display, to run
+only the detection software. Tkinter is then never loaded.
+
 """
 # les importations
-import Tkinter as tk
-import tkMessageBox
-import thread
+import signal
+import sys
 import time
 import urllib
 
-from PIL import Image, ImageTk
-
-import senddata
+import analysispool
+import boxstore
 import imageread
+import framegate
+import framesource
+import pipeline
+import scheduler
+import spool
+import supervisor
+import timing
 import data.settings as s
 
 try:
@@ -29,212 +37,18 @@ except ImportError:
     print "ERROR: setup_data.py does not exist. Run ./pipark_setup.py first."
     sys.exit(1)
 
+try:
+    # several cameras, see load_camera_data()
+    import setup_cameras
+except ImportError:
+    setup_cameras = None
+
 # global variables
 app = None
 camera = None
-has_quit = False
-occupancy = [None for i in range(10)]  # list of booleans. True for occupied, False for empty. None for no space.
-
-# ==============================================================================
-#
-#       Tkinter Application
-#
-# ==============================================================================
-class MainApplication(tk.Frame):
-    # ------------------------------------------------------------------------------
-    #  Instance Attributes
-    # ------------------------------------------------------------------------------
-    
-    # output messages to the terminal?
-    __is_verbose = s.IS_VERBOSE
-    
-    # pi camera
-    __camera = None
-    __preview_is_active = False
-    
-    __label = ""
-    
-    # --------------------------------------------------------------------------
-    #  Constructor Method
-    # --------------------------------------------------------------------------
-    def __init__(self, master = None):
-        """Application constructor method. """
-        if self.__is_verbose: print "INFO: Application constructor called."
-
-        # run super constructor method
-        tk.Frame.__init__(self, master)
-        
-        # apply grid layout
-        self.grid()
-        
-        # give application a reference to the global camera object
-        global camera
-        self.__camera = camera
-        self.__camera.awb_mode = 'auto'
-        self.__camera.exposure_mode = 'auto'
-        
-        # populate the application WITH W-W-W-WWIDDDDGEETTSS
-        self.__createWidgets()
-        
-        # create canvas to display logo
-        self.logo = tk.Canvas(self, width = 400, height = 148)
-        self.logo.grid(row = 0, column = 0, rowspan = 1, columnspan = 2)
-        self.loadImage("./images/logo_main.jpeg", self.logo, 400/2, 148/2)
-        self.updateText()
-        
-        # create key-press handlers -> set focus to this frame
-        self.bind("<Escape>", self.escapePressHandler)
-        self.focus_set()
-    
-    def updateText(self):
-        num_spaces = 0
-        occupied = 0
-        
-        global occupancy
-        
-        
-        for i in occupancy:
-            if i != None: num_spaces += 1
-            if i == True: occupied += 1
-        
-        self.__label = "Parking Spaces Available:", occupied, "/", num_spaces
-        
-        self.loadImage("./images/logo_main.jpeg", self.logo, 400/2, 148/2)
-        self.logo.create_text((200, 130), text = self.__label, fill = "white")
-        
-    # --------------------------------------------------------------------------
-    #  Key Event Handlers
-    # --------------------------------------------------------------------------
-    def escapePressHandler(self, event):
-        """Handle ESCAPE key events. """
-        
-        if self.__is_verbose: print "ACTION: ESCAPE key pressed."
-        
-        
-        # if the camera is previewing -> stop the preview
-        if self.__camera and self.__preview_is_active:
-            self.__camera.stop_preview()
-            self.__preview_is_active = False
-            if self.__is_verbose: print "INFO: Camera preview stopped. "
-            
-            # reset focus to application frame
-            self.focus_set()
-    
-    # --------------------------------------------------------------------------
-    #  Button Press Events
-    # --------------------------------------------------------------------------
-    def clickStartPreview(self):
-        """Handle 'Start Preview' button click events. """
-        if self.__is_verbose: print "ACTION: 'Start Preview' clicked! "
-        
-        # turn on the camera preview
-        if self.__camera and not self.__preview_is_active:
-            
-            tkMessageBox.showinfo(
-                title = "Show Camera Feed",
-                message = "Press the ESCAPE key to exit preview mode"
-                )
-
-            #self.__camera.brightness = 70;
-            #self.__camera.awb_mode = 'auto';
-            
-            self.__camera.start_preview()
-            self.__preview_is_active = True
-            if self.__is_verbose: print "INFO: Camera preview started. "
-            
-            # reset focus to the application frame
-            self.focus_set()
-    
-    
-    def clickQuit(self):
-        """Handle 'Quit' button click events. """
-        
-        # use global variable 'has_quit'
-        global has_quit
-        
-        self.quit()
-        self.master.destroy()
-        has_quit = True  # trigger exit of program
-    
-    # --------------------------------------------------------------------------
-    #  Create Widgets
-    # --------------------------------------------------------------------------
-    def __createWidgets(self):
-        """Create the widgets. """
-        if self.__is_verbose: print "INFO: Creating Widgets!"
-        
-        # create show preview button
-        self.preview_button = tk.Button(self, text = "Show Camera Feed",
-            command = self.clickStartPreview)
-        self.preview_button.grid(row = 1, column = 0, 
-            sticky = tk.W + tk.E + tk.N + tk.S)
-        
-        # create quit button
-        self.quit_button = tk.Button(self, text = "Quit",
-            command = self.clickQuit)
-        self.quit_button.grid(row = 1, column = 1, 
-            sticky = tk.W + tk.E + tk.N + tk.S)
-    
-    # --------------------------------------------------------------------------
-    #   Load Image
-    # --------------------------------------------------------------------------
-    def loadImage(self, image_address, canvas, width, height):
-        """
-        Load image at image_address. If the load is successful then return True,
-        otherwise return False.
-        
-        Keyword Arguments:
-        image_address -- The address of the image to be loaded (default = './').
-        canvas -- The Tkinter Canvas into which the image is loaded.
-        width -- Width of the image to load.
-        height -- Height of the image to load.
-        
-        Returns:
-        Boolean -- True if load successful, False if not.
-        
-        """
-        # clear the old canvas
-        canvas.delete(tk.ALL)
-        
-        if self.__is_verbose:
-            print "INFO: Tkinter Canvas cleared. Read to load new image. "
-        
-        try:
-            # guard against incorrect argument datatypes
-            if not isinstance(canvas, tk.Canvas): raise TypeError
-            if not isinstance(image_address, str): raise TypeError
-            if not isinstance(width, int): raise TypeError
-            if not isinstance(height, int): raise TypeError
-            
-            # load the image into the canvas
-            photo = ImageTk.PhotoImage(Image.open(image_address))
-            canvas.create_image((width, height), image = photo)
-            canvas.image = photo
-            
-            # image load successful
-            return True
-        
-        except TypeError:
-            # arguments of incorrect data type, load unsuccessful
-            if self.__is_verbose: 
-                print "ERROR: loadImage() arguments of incorrect data type."
-            return False
-        except:
-            # image failed to load
-            if self.__is_verbose: 
-                print "ERROR: loadImage() failed to load image " + image_address
-            return False
-            
-    
-    # --------------------------------------------------------------------------
-    #  Getter(s)
-    # --------------------------------------------------------------------------
-    # is verbose
-    def getIsVerbose():
-        """Retrun boolean whether application is verbose or not. """
-        return self.__is_verbose
-        
-
+cameras = []  # configuration of each camera, see load_camera_data()
+runtime = None  # supervisor.Supervisor of the program's threads.
+occupancy = None  # boxstore.BoxStore holding the status of every space.
 
 # ==============================================================================
 #
@@ -246,7 +60,7 @@ class MainApplication(tk.Frame):
 # ------------------------------------------------------------------------------
 def create_application():
     """
-    Create an instance of the MainApplication class defined in this module. 
+    Create an instance of the MainApplication class defined in gui.py. 
     Set the GUI to run in its mainloop().
     
     """
@@ -254,11 +68,38 @@ def create_application():
     
     global app
     
+    # only import Tkinter when there is a GUI, see is_headless()
+    import gui
+    
+    # quitting from the application quits the whole program
+    on_quit = None
+    if runtime is not None: on_quit = runtime.quit
+    
     # create the TKinter application
-    root = tk.Tk()
-    app = MainApplication(master = root)
-    app.master.title("PiPark 2014")
-    app.mainloop()
+    root = gui.tk.Tk()
+    application = gui.MainApplication(master = root, camera = camera,
+        on_quit = on_quit)
+    application.master.title("PiPark 2014")
+    if occupancy is not None:
+        application.updateText(occupancy.countOccupied(),
+            occupancy.countKnown())
+    app = application
+    
+    # close the application when quitting, from the Tkinter thread
+    if runtime is not None:
+        runtime.onQuit(lambda: application.post(application.close))
+    application.mainloop()
+
+# ------------------------------------------------------------------------------
+#  Is Headless
+# ------------------------------------------------------------------------------
+def is_headless():
+    """
+    Return True if PiPark should run without its GUI, i.e. if HEADLESS is set
+    or main.py was run with --headless.
+    
+    """
+    return s.HEADLESS or "--headless" in sys.argv[1:]
 
 # ------------------------------------------------------------------------------
 #  Run PiPark
@@ -273,6 +114,16 @@ def run():
     registered) is updated to accordingly show whether the appropriate parking
     spaces are filled or empty.
     
+    Capture, analysis and upload each run in their own thread (see
+    pipeline.py), so a slow server does not delay detection. All of the spaces
+    that change in a tick are sent to the server in a single request. Changes
+    are first saved to the update spool (see spool.py), so none are lost while
+    the server cannot be reached.
+    
+    When there are several cameras each has its own capture and analysis
+    threads, working in parallel. Their results are merged into one occupancy
+    table and sent to the server through the same spool.
+    
     This function is run mainly as an infinite loop until the application
     is destroyed.
     
@@ -282,153 +133,310 @@ def run():
      # --- Pre-loop Setup ------------------------------------------------------
     
     # variables
-    global camera  # use global pi camera object!
+    global cameras  # use global camera configurations!
     global occupancy
-    global app
-    
-    image_location = "./images/pipark.jpeg"  # image save location
-    loop_delay = s.PICTURE_DELAY  # duration between each loop in seconds
-        
-    # load data sets and count the number of spaces and control boxes
-    space_boxes, control_boxes = __setup_box_data()
-    num_spaces = len(space_boxes)
-    num_controls = len(control_boxes)
-    if s.IS_VERBOSE: print "INFO: #Spaces:", num_spaces, "\t#CPs:", num_controls
-    
-    # assert that the correct number of spaces and CPs are present in the data
-    assert num_spaces > 0
-    assert num_controls == 3
     
-    # set initial values for status and ticks
-    last_status = [None for i in range(10)]
-    last_ticks = [3 for i in range(10)]
+    # status and ticks of every space, shared by every camera. Space ids are
+    # unique across all of the cameras.
+    spaces = boxstore.BoxStore([box[0] for config in cameras
+        for box in config["boxes"] if box[1] == 0])
+    occupancy = spaces
+    
+    
+    # --- Data Upload Phase ----------------------------------------------------
+    
+    # updates are saved to the spool, from which the flusher thread sends them
+    # to the server in order, holding on to them until the server is reachable
+    update_spool = spool.UpdateSpool()
+    flusher = spool.SpoolFlusher(update_spool)
+    flusher.start()
+    
+    # updates not yet sent when quitting stay in the spool until next time
+    if runtime is not None: runtime.onQuit(flusher.stop)
+    
+    def upload(updates):
+        """Queue a list of (area id, status) updates for the server. """
+        update_spool.append(updates)
+        flusher.wake()
+    
+    # create a capture and analysis pipeline for each camera
+    pipelines = []
+    
+    for config in cameras:
+        # load data sets and count the number of spaces and control boxes
+        space_boxes, control_boxes = __setup_box_data(config["boxes"])
+        num_spaces = len(space_boxes)
+        num_controls = len(control_boxes)
+        if s.IS_VERBOSE: print "INFO: #Spaces:", num_spaces, "\t#CPs:", num_controls
+        
+        # assert that the correct number of spaces and CPs are present in the data
+        assert num_spaces > 0
+        assert num_controls >= 3
+        
+        # when CROP_TO_BOXES is set, only the part of the picture containing
+        # the boxes is captured and analysed
+        roi = __get_roi(space_boxes, control_boxes)
+        if s.IS_VERBOSE and roi is not None:
+            print "INFO: Cropping frames to (x, y, w, h):", roi
+        
+        # source of the frames to process, as set by FRAME_SOURCE
+        source = framesource.create_frame_source(config["camera"],
+            config["boxes"], config["source"], config["path"], roi)
+        
+        analyse = __create_analyser(space_boxes, control_boxes, spaces, roi,
+            source.scheduler, config.get("analysis_pool"),
+            source.getResolution())
+        pipelines.append(pipeline.Pipeline(source, analyse, upload,
+            supervisor = runtime))
+    
+    # capture, analyse and upload in separate threads until the frame sources
+    # run out of frames, or the program quits. Stages which crash are
+    # restarted by the supervisor.
+    for detection in pipelines:
+        if runtime is not None: runtime.onQuit(detection.stop)
+        detection.start()
+    for detection in pipelines: detection.join()
+
+
+# ------------------------------------------------------------------------------
+#  Create Analyser
+# ------------------------------------------------------------------------------
+def __create_analyser(space_boxes, control_boxes, spaces, roi = None,
+        tick_scheduler = None, pool = None, resolution = None):
+    """
+    Create the function which analyses the frames of one camera.
+    
+    Arguments:
+    space_boxes -- Parking space boxes of the camera.
+    control_boxes -- Control point boxes of the camera.
+    spaces -- BoxStore holding the status of every space.
+    
+    Keyword Arguments:
+    roi -- (x, y, w, h) of the region to which the frames are cropped, or
+        None for whole frames.
+    tick_scheduler -- TickScheduler of the camera's frame source, told after
+        each frame whether anything is happening in the car park.
+    pool -- analysispool.AnalysisPool of the camera, see
+        __create_analysis_pool(), or None to average the boxes in this
+        process.
+    resolution -- (width, height) of the frame source's frames, used to
+        allocate the tables averaging the boxes once rather than every tick.
+    
+    Returns:
+    analyse -- Function taking a frame and returning the list of (area id,
+        status) updates.
     
+    """
     
-    while True:
-        # --- Space and CP Average Calculation Phase ---------------------------
+    # work out the area of every box, relative to the ROI and scaled to the
+    # downsampled frame, and the index of each space in the store, once
+    # rather than every tick
+    scale = max(1, s.ANALYSIS_SCALE)
+    layout = __create_layout(space_boxes, control_boxes, roi, scale)
+    num_spaces = layout.num_spaces
+    space_indices = spaces.indices(layout.getSpaceIds())
+    
+    # boxes at full resolution, to check the downsampled results against
+    full_layout = layout
+    if scale > 1:
+        full_layout = __create_layout(space_boxes, control_boxes, roi)
+    num_ticks = [0]
+    
+    # if verbose, print the dimensions of every space and CP to terminal
+    if s.IS_VERBOSE:
+        for box_id, box_type, area in zip(layout.ids, layout.types,
+                layout.areas):
+            print "INFO:", ("Space" if box_type == 0 else "CP"), box_id, "dimensions:"
+            print "      x:", area[0], "y:", area[1], "w:", area[2], "h:", area[3]
+        print ""  # line break
+    
+    # skips the analysis of frames in which nothing has changed, reusing the
+    # (is_occupied, margins) of the last frame analysed
+    gate = None
+    if s.GATE_STEP > 0: gate = framegate.FrameGate()
+    last_results = [None]
+    
+    # without a pool of worker processes, when the scene has changed, only
+    # averages and compares the boxes which have changed, reusing the cached
+    # results of the rest
+    cache = None
+    if pool is None and s.BOX_CACHE and imageread.numpy is not None:
+        cache = framegate.BoxCache(layout)
+    
+    # otherwise every box is averaged using an integral image, the table of
+    # which is allocated once and rebuilt in place each tick. There is a
+    # second table for the checks against the full resolution frame.
+    integral = None
+    full_integral = None
+    if resolution is not None and imageread.numpy is not None:
+        if pool is None and cache is None:
+            integral = imageread.IntegralImage(resolution =
+                imageread.get_reduced_resolution(resolution, scale))
+        if scale > 1 and s.ANALYSIS_SCALE_CHECK > 0:
+            full_integral = imageread.IntegralImage(resolution = resolution)
+    
+    def measure(image):
+        """
+        Decide whether each space in a frame is occupied.
         
-        # clear lists containing average colour values for spaces
-        space_averages = []
-        control_averages = []
+        Returns:
+        (is_occupied, margins) -- As returned by imageread.compare_areas().
         
-        # capture new image & save to specified location
-        camera.capture(image_location)
-        print "INFO: New image saved to:", image_location
-
-        try:
-            # load image for processing
-            image = imageread.Image.open(image_location)
-            pixels = image.load()
-        except:
-            print "ERROR: The image has failed to load. Check camera setup. "
-            sys.exit(1)
-
-        # setup space dimensions and averages, and if verbose, print to terminal
-        for space in space_boxes:
-            space_x = space[2]
-            space_y = space[3]
-            space_w = abs(space[4] - space[2])
-            space_h = abs(space[5] - space[3])
-            
-            if s.IS_VERBOSE: 
-                print "INFO: Space", space[0], "dimensions:"
-                print "      x:", space_x, "y:", space_y, "w:", space_w, "h:", space_h
-            
-            # append space average pixel to list of averages
-            space_average = imageread.get_area_average(
-                pixels, 
-                space_x, 
-                space_y, 
-                space_w, 
-                space_h
-                )
-            space_averages.append(space_average)
+        """
         
+        # --- Space and CP Average Calculation Phase ---------------------------
         
-        if s.IS_VERBOSE: print ""  # line break
-
-        # setup CP dimensions and averages and, if verbose, print to terminal
-        for control in control_boxes:
-            control_x = control[2]
-            control_y = control[3]
-            control_w = abs(control[4] - control[2])
-            control_h = abs(control[5] - control[3])
-
-            if s.IS_VERBOSE: 
-                print "INFO: CP", control[0], "dimensions:"
-                print "      x:", control_x, "y:", control_y, "w:", control_w, "h:", control_h
+        # calculate the average pixel of every space and CP in a single pass,
+        # using an integral image built once for this (downsampled) frame
+        frame = imageread.reduce_frame(image, scale)
+        if cache is not None:
+            averages, differences, is_occupied, margins = cache.measure(frame)
+            if s.IS_VERBOSE:
+                print "INFO: Box cache hits:", cache.hits, "misses:",
+                print cache.misses, "(%.0f%%)." % (100 * cache.getHitRate())
+        elif pool is not None:
+            with timing.timed("averaging"):
+                averages = pool.getAverages(frame)
+            if s.IS_VERBOSE and num_ticks[0] % 100 == 0:
+                print "INFO: Analysis worker timings:\n" + pool.getReport()
+        else:
+            with timing.timed("averaging"):
+                averages = imageread.get_area_averages(frame, layout.areas,
+                    as_array = True, integral = integral)
+        
+        # every ANALYSIS_SCALE_CHECK ticks, report how far the downsampled
+        # results are from those at full resolution
+        num_ticks[0] += 1
+        if (scale > 1 and s.ANALYSIS_SCALE_CHECK > 0
+                and num_ticks[0] % s.ANALYSIS_SCALE_CHECK == 0):
+            full_averages = imageread.get_area_averages(image,
+                full_layout.areas, as_array = True, integral = full_integral)
+            max_difference, mean_difference, num_disagreeing = \
+                imageread.get_divergence(full_averages, averages, num_spaces)
+            print "INFO: Downsampled by %d, averages differ from full" % scale,
+            print "resolution by up to", max_difference, "(mean %.2f)," % mean_difference,
+            print num_disagreeing, "of", num_spaces, "space(s) decided differently."
             
-            # append control average pixel to list of averages
-            control_average = imageread.get_area_average(
-                pixels, 
-                control_x, 
-                control_y, 
-                control_w, 
-                control_h
-                )
-            control_averages.append(control_average)
             
-            
-        # --- Average Comparisons and Data Upload Phase ------------------------
+        # --- Average Comparisons Phase ----------------------------------------
         
         # average pixel values now calculated for all Control Points and Parking
-        # Spaces. Now move on to comparison and upload phase.
+        # Spaces. Now move on to comparison phase.
         if s.IS_VERBOSE: print "\n\n"  # doubleline break
         
-        # compare control points averages to parking spaces averages
-        for i, space in zip(space_boxes, space_averages):
-            
-            # number of control points that conflict with parking space reading
-            num_controls = 0
-            
-            print "INFO: Checking for differences...\n     ",
-            # for each control point (3 in total) compare each parking space
-            for control in control_averages:
+        # compare every parking space with every control point (at least 3).
+        # A space is occupied if a majority of the CPs conflict with it.
+        if cache is None:
+            with timing.timed("compare"):
+                differences, votes, is_occupied, margins = \
+                    imageread.compare_areas(averages[:num_spaces],
+                    averages[num_spaces:], with_margins = True)
+        
+        if s.IS_VERBOSE:
+            for space_id, row, filled in zip(layout.getSpaceIds(),
+                    differences, is_occupied):
+                print "INFO: Checking for differences...\n     ",
+                for is_different in row: print ("Y" if is_different else "N"),
+                print "=> Space", space_id, "is", ("filled.\n" if filled else "empty.\n")
+        
+        return is_occupied, margins
+    
+    def analyse(image):
+        """Analyse a frame, returning the list of (area id, status) updates. """
+        
+        # only analyse the frame if the scene has changed since the last one
+        # analysed, otherwise its decisions are the same
+        if gate is None or gate.hasChanged(image) or last_results[0] is None:
+            last_results[0] = measure(image)
+        elif s.IS_VERBOSE:
+            print "INFO: Scene unchanged for", gate.num_skipped, "frame(s)."
+        is_occupied, margins = last_results[0]
+        
+        # update the server with most recent space values after 3 ticks, for
+        # every space of this camera at once. Unchanged frames still count as
+        # ticks of the status they show.
+        updates = spaces.update(space_indices, is_occupied)
+        
+        # take frames more often while spaces are changing, or are close to
+        # changing, and less often while the car park is quiet
+        if tick_scheduler is not None:
+            tick_scheduler.setActive(bool(updates)
+                or spaces.isPending(space_indices)
+                or scheduler.is_near_threshold(margins))
+        
+        for space_id, num in updates:
+            print "      Space", space_id, "has changed status to", ("occupied" if num else "vacant") + ", sending update to server...\n"
                 
-                # make comparison
-                if imageread.compare_area(space, control):
-                    num_controls += 1
-                    print "Y",
-                else:
-                    print "N",
+        # the counts shown only change when a space's status does, and the
+        # application is only updated from its own thread, which times the
+        # update itself
+        if updates and app is not None:
+            app.showCounts(spaces.countOccupied(), spaces.countKnown())
+        return updates
+    
+    return analyse
 
-            # determine if parking space is occupied. If at least two CPs agree
-            # that the space is occupied, set the space to occupied.
-            is_occupied = False
-            if num_controls >= 2: is_occupied = True
-            
-            if s.IS_VERBOSE and is_occupied:
-                print "=> Space", i[0], "is filled.\n"
-            elif s.IS_VERBOSE and not is_occupied:
-                print "=> Space", i[0], "is empty.\n"
-            
-            # update the server with most recent space values after 3 ticks
-            if last_status[i[0]] != is_occupied:
-                print "      Detected change in space", i[0]
-                print "      Space", i[0], "has been", ("occupied" if is_occupied else "vacant"), "for", last_ticks[i[0]], "tick(s).\n"
-                
-                if last_ticks[i[0]] < 3:
-                    last_ticks[i[0]] += 1
-                else:
-                    last_status[i[0]] = is_occupied
-                    last_ticks[i[0]] = 1
-                    print "      Space", i[0], "has changed status, sending update to server...\n"
-                    num = 1 if is_occupied else 0
-                    occupancy = last_status
-                    
-                    
-                    sendoutput = senddata.send_update(i[0], num)
-                    if "success" in sendoutput.keys():
-                        print "      Success:", sendoutput["success"]
-                    elif "error" in sendoutput.keys():
-                        print "      Error:", sendoutput["error"]
-                    print ''
-            else:
-                last_ticks[i[0]] = 1
-                
-        app.updateText()
-        if s.IS_VERBOSE: print "INFO: Sleep for", loop_delay, "seconds... Zzz."
-        imageread.time.sleep(loop_delay)
+
+# ------------------------------------------------------------------------------
+#  Get ROI
+# ------------------------------------------------------------------------------
+def __get_roi(space_boxes, control_boxes):
+    """
+    Return the (x, y, w, h) of the region to which a camera's frames are
+    cropped, i.e. the bounding box of its boxes when CROP_TO_BOXES is set,
+    or None for whole frames.
+    
+    """
+    if not s.CROP_TO_BOXES: return None
+    return boxstore.get_bounding_box(space_boxes + control_boxes)
+
+
+# ------------------------------------------------------------------------------
+#  Create Layout
+# ------------------------------------------------------------------------------
+def __create_layout(space_boxes, control_boxes, roi = None, scale = 1):
+    """
+    Return the boxstore.BoxLayout of a camera's boxes, relative to the ROI
+    and scaled to frames downsampled by scale.
+    
+    """
+    origin = (0, 0)
+    if roi is not None: origin = roi[:2]
+    return boxstore.BoxLayout(space_boxes, control_boxes, origin, scale)
+
+
+# ------------------------------------------------------------------------------
+#  Create Analysis Pool
+# ------------------------------------------------------------------------------
+def __create_analysis_pool(box_data):
+    """
+    Create the pool of worker processes which average the boxes of one
+    camera's frames, with ANALYSIS_WORKERS workers. The workers are forked
+    straight away, so this is called before any threads are started.
+    
+    Arguments:
+    box_data -- Box data of the camera, as saved in setup_data.py.
+    
+    Returns:
+    pool -- The analysispool.AnalysisPool, or None if the camera has no
+        boxes.
+    
+    """
+    __check_box_sizes(box_data)
+    
+    space_boxes = [box for box in box_data if box[1] == 0]
+    control_boxes = [box for box in box_data if box[1] == 1]
+    if not space_boxes or not control_boxes: return None
+    
+    # the frames analysed are those of the frame source, downsampled by
+    # ANALYSIS_SCALE
+    roi = __get_roi(space_boxes, control_boxes)
+    scale = max(1, s.ANALYSIS_SCALE)
+    layout = __create_layout(space_boxes, control_boxes, roi, scale)
+    resolution = imageread.get_reduced_resolution(
+        framesource.get_resolution(roi), scale)
+    
+    return analysispool.AnalysisPool(layout, resolution)
 
 
 # -----------------------------------------------------------------------------
@@ -438,48 +446,101 @@ def main():
     """Start PiPark application and Smart Parking System loop. """
     
     # use global variables (Oh D-d-d-dear)!
-    global has_quit
     global camera
-    
-    # instantiate the camera object to global camera variable
-    camera = imageread.setup_camera(is_fullscreen = False)
+    global cameras
+    global runtime
+    
+    cameras = load_camera_data()
+    
+    # with ANALYSIS_WORKERS set, the boxes of each camera are averaged by that
+    # many worker processes, using every core of the Pi. They are forked first,
+    # before the cameras or any threads are started.
+    if s.ANALYSIS_WORKERS > 0 and imageread.numpy is not None:
+        for config in cameras:
+            config["analysis_pool"] = __create_analysis_pool(config["boxes"])
+    
+    # instantiate the camera object of each camera. This is None for cameras
+    # whose frames do not come from a PiCam.
+    for config in cameras:
+        config["camera"] = imageread.setup_camera(is_fullscreen = False,
+            camera_num = config["camera_num"], source = config["source"])
+    
+    # the first PiCam is used for the preview in the GUI
+    for config in cameras:
+        if config["camera"]:
+            camera = config["camera"]
+            break
+    
+    # time each stage of every tick, reporting the timings every
+    # TIMING_INTERVAL seconds and whenever SIGUSR1 is received
+    if s.TIMING:
+        timing.enable()
+        if hasattr(signal, "SIGUSR1"): signal.signal(signal.SIGUSR1, timing.dump)
+        if s.TIMING_INTERVAL > 0: timing.Reporter().start()
     
     # now create two threads, one in which to run the MainApplication and
-    # the other the run the main program loop.
+    # the other the run the main program loop. Quit on SIGTERM or SIGINT as
+    # well as from the application. Headless, only the main program loop is
+    # run, and PiPark quits once it has finished.
+    runtime = supervisor.Supervisor()
+    runtime.handleSignals()
+    for config in cameras:
+        if config.get("analysis_pool") is not None:
+            runtime.onQuit(config["analysis_pool"].close)
     
     try:
-        thread.start_new_thread(create_application, ())
-        thread.start_new_thread(run, ())
+        if is_headless():
+            if s.IS_VERBOSE: print "INFO: Running headless."
+            runtime.spawn("run", __run_headless)
+        else:
+            runtime.spawn("gui", create_application)
+            runtime.spawn("run", run)
     except:
-    	print "ERROR: Failed to start new thread. =("
-        
-    # do not end main thread until user has quit and destroyed the application
-    while not has_quit:
-    	pass
+        print "ERROR: Failed to start new thread. =("
+        runtime.quit()
+        
+    # do not end main thread until user has quit and destroyed the application,
+    # then give the threads time to finish their current work
+    runtime.wait()
+    if not runtime.join():
+        print "ERROR: Threads did not finish within", supervisor.SHUTDOWN_TIMEOUT,
+        print "seconds, exiting anyway."
+
+# -----------------------------------------------------------------------------
+#  Run Headless
+# -----------------------------------------------------------------------------
+def __run_headless():
+    """Run PiPark without the GUI, quitting once run() has finished. """
+    try:
+        run()
+    finally:
+        runtime.quit()
 
 # -----------------------------------------------------------------------------
 #  Setup Box Data
 # -----------------------------------------------------------------------------
-def __setup_box_data():
-    """Import and return the boxes dictionary from setup_data.py. """
+def __setup_box_data(box_data):
+    """
+    Split a camera's boxes into parking spaces and control points.
     
-    # attempt to load dictionary from setup_data.py, if file does not exist
-    # print error message and quit the program
-    try:
-        box_data = setup_data.boxes
-        print "INFO: box_data successfully created."
-    except:
-        print "ERROR: setup_data.py does not contain the variable 'boxes'."
-        sys.exit()
+    Arguments:
+    box_data -- Box data of the camera, as saved in setup_data.py.
     
-    # setup_data.py exists, check that dictionary contains items, if dicionary
-    # is empty print error message and quit the program
+    Returns:
+    (space_boxes, control_boxes) -- Tuple of the lists of each type of box.
+    
+    """
+    
+    # check that dictionary contains items, if dicionary is empty print error
+    # message and quit the program
     if not box_data:
-        print "ERROR: boxes in setup_data.py is empty!"
+        print "ERROR: boxes of camera are empty!"
         sys.exit()
     else:
         print "INFO: box_data contains data!"
 
+    __check_box_sizes(box_data)
+    
     space_boxes = []
     control_boxes = []
     
@@ -490,7 +551,86 @@ def __setup_box_data():
 
     print "space boxes:", space_boxes, "\ncontrol boxes:", control_boxes
     return space_boxes, control_boxes
+
+# -----------------------------------------------------------------------------
+#  Check Box Sizes
+# -----------------------------------------------------------------------------
+def __check_box_sizes(box_data):
+    """
+    Quit the program if any of a camera's boxes has no width or no height,
+    and so has no pixels to average.
+    
+    Arguments:
+    box_data -- Box data of the camera, as saved in setup_data.py.
+    
+    """
+    for data_set in box_data:
+        if data_set[2] == data_set[4] or data_set[3] == data_set[5]:
+            print "ERROR: Box", data_set[0], "has no area. Run",
+            print "./pipark_setup.py again to redraw it."
+            sys.exit()
         
+# -----------------------------------------------------------------------------
+#  Load Camera Data
+# -----------------------------------------------------------------------------
+def load_camera_data():
+    """
+    Return the configuration of each camera, as a list of dictionaries with
+    the keys:
+    
+        source -- The frame source, see FRAME_SOURCE.
+        path -- The path of the frame source, see FRAME_SOURCE_PATH.
+        camera_num -- Which PiCam to use, for boards with more than one.
+        boxes -- The boxes of the camera, as saved in setup_data.py.
+    
+    With one camera this is taken from the settings and setup_data.py. To use
+    several cameras, create setup_cameras.py holding a list 'cameras' of these
+    dictionaries. Any key left out takes its single camera value. Space ids
+    must be unique across all of the cameras, as every space is registered on
+    the server under the same pi.
+    
+    Raises:
+    ValueError -- When two cameras share a space id.
+    
+    """
+    
+    # attempt to load boxes from setup_data.py, if they do not exist print
+    # error message and quit the program
+    try:
+        box_data = setup_data.boxes
+        print "INFO: box_data successfully created."
+    except:
+        print "ERROR: setup_data.py does not contain the variable 'boxes'."
+        sys.exit()
+    
+    camera_data = [{}]
+    if setup_cameras is not None:
+        reload(setup_cameras)
+        camera_data = setup_cameras.cameras
+    
+    configs = []
+    space_ids = set()
+    
+    for i, entry in enumerate(camera_data):
+        config = {
+            "source": entry.get("source", s.FRAME_SOURCE),
+            "path": entry.get("path", s.FRAME_SOURCE_PATH),
+            "camera_num": entry.get("camera_num", i),
+            "boxes": entry.get("boxes", box_data)
+            }
+        
+        # ensure that no space id is used by more than one camera
+        for box in config["boxes"]:
+            if box[1] != 0: continue
+            if box[0] in space_ids:
+                raise ValueError("Space id " + str(box[0]) + " is used by "
+                    + "more than one camera.")
+            space_ids.add(box[0])
+        
+        configs.append(config)
+    
+    return configs
+
 # -----------------------------------------------------------------------------
 #  Run Program
 # -----------------------------------------------------------------------------
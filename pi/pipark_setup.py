@@ -11,6 +11,8 @@ Version: 2.1 [2014/03/26]
 
 """
 import os
+import Queue
+import threading
 import Tkinter as tk
 import tkMessageBox
 from PIL import Image, ImageTk
@@ -44,10 +46,20 @@ class Application(tk.Frame):
     __camera = None
     __camera_is_active = False
     
+    # progress messages from the registration thread
+    __register_queue = None
+    
+    # number keys typed so far when selecting a box, and when the last was typed
+    __typed_number = ""
+    __last_key_time = 0
+    
     # image load/save locoations
     SETUP_IMAGE = "./images/setup.jpeg"
     DEFAULT_IMAGE = "./images/default.jpeg"
     
+    # number keys typed less than this many milliseconds apart form one number
+    KEY_TIMEOUT = 1000
+    
     
     # --------------------------------------------------------------------------
     #   Constructor Method
@@ -181,7 +193,7 @@ class Application(tk.Frame):
         print >> f1, 'boxes = ['
         
         # for every parking space, save the data to ./setup_data.py
-        for i in range(self.__parking_spaces.length()):
+        for i in self.__parking_spaces.ids():
             space = self.__parking_spaces.get(i).getOutput()
             
             # ignore the space if no data present
@@ -190,7 +202,7 @@ class Application(tk.Frame):
                 print >> f1, space, ','
         
         # for every control point, save the data to ./setup_data.py
-        for j in range(self.__control_points.length()):
+        for j in self.__control_points.ids():
             cp = self.__control_points.get(j).getOutput()
             
             # ignore the CP if no data present
@@ -232,7 +244,7 @@ class Application(tk.Frame):
         Check that the setup data meets the following criteria:
         
             1) There is at least 1 parking space.
-            2) There are exactly 3 control points.
+            2) There are at least 3 control points.
             
         Returns:
         Boolean -- True if criteria is met, False if not.
@@ -273,8 +285,8 @@ class Application(tk.Frame):
             elif self.__is_verbose:
                 print "ERROR: Box-type not set to either 0 or 1."
         
-        # data is valid if there is at least 1 space and exactly 3 control points
-        if len(space_boxes) > 0 and len(control_boxes) == 3: 
+        # data is valid if there is at least 1 space and 3 control points
+        if len(space_boxes) > 0 and len(control_boxes) >= 3: 
             valid_data = True
         else:
             valid_data = False
@@ -304,15 +316,15 @@ class Application(tk.Frame):
                     message = "Registration not completed.")
                 return
                 
-        # check that most recent saved data is valid (#CPs == 3, #Spaces > 0)
+        # check that most recent saved data is valid (#CPs >= 3, #Spaces > 0)
         if not self.checkData():
 
             # data invalid, so display message and return
             tkMessageBox.showinfo(
                 title = "PiPark Setup",
                 message = "Registration not complete.\n\nSaved data is "
-                + "invalid. Please ensure that there are 3 control points and "
-                + "at least 1 parking spaces marked."
+                + "invalid. Please ensure that there are at least 3 control "
+                + "points and at least 1 parking spaces marked."
                 )
             return
                 
@@ -334,29 +346,79 @@ class Application(tk.Frame):
             return
         
 
+        # get the parking spaces of every camera
+        try:
+            area_ids = [box[0] for config in main.load_camera_data()
+                for box in config["boxes"] if box[1] == 0]
+        except ValueError, err:
+            print "ERROR:", err
+            return
+        
+        # register in a background thread, so that the GUI does not freeze
+        # while waiting for the server. Progress is shown in the title bar.
+        
+        self.register_button.config(state = tk.DISABLED)
+        self.__register_queue = Queue.Queue()
+        
+        worker = threading.Thread(target = self.__registerAreas,
+            args = (area_ids, ))
+        worker.daemon = True
+        worker.start()
+        
+        self.after(100, self.__checkRegisterProgress)
+    
+    def __registerAreas(self, area_ids):
+        """
+        Deregister the pi, then register each parking space on the server, with
+        several requests in flight at once. Runs in its own thread, and reports
+        back through __register_queue as (message, is_finished) pairs.
+        
+        """
+        import senddata
+        
         # deregister all areas associated with this pi (start fresh)
         out = senddata.deregister_pi()
         
-        try:
-            out['error']
+        if "error" in out.keys():
             print "ERROR: Error in connecting to server. Please update settings.py."
+            self.__register_queue.put(("Registration failed", True))
             return
-        except:
-            pass
+        
+        def progress(area_id, output, num_done, num_total):
+            if "error" in output.keys():
+                if self.__is_verbose: print "ERROR:", output["error"]
+            elif self.__is_verbose:
+                print "INFO: Registering area", area_id, "on server."
+            
+            self.__register_queue.put(
+                ("Registering %d/%d" % (num_done, num_total), False))
         
         # register each box on the server
-        for box in boxes:
-            if box[1] == 0:
-                output = senddata.register_area(box[0])
-                if "error" in output.keys():
-                    if self.__is_verbose: print "ERROR:", output["error"]
-                    return
-                else:
-                    if self.__is_verbose:
-                        print "INFO: Registering area", box[0], "on server."
+        results = senddata.register_areas(area_ids, progress = progress)
+        
+        if [output for output in results.values() if "error" in output.keys()]:
+            self.__register_queue.put(("Registration failed", True))
+            return
          
         # print success message if verbose        
         if self.__is_verbose: print "\nINFO: Server registration successful."
+        self.__register_queue.put(("Registration successful", True))
+    
+    def __checkRegisterProgress(self):
+        """Show the progress of the registration thread in the title bar. """
+        is_finished = False
+        
+        try:
+            while not is_finished:
+                message, is_finished = self.__register_queue.get_nowait()
+                self.master.title("PiPark Setup - " + message)
+        except Queue.Empty:
+            pass
+        
+        if is_finished:
+            self.register_button.config(state = tk.NORMAL)
+        else:
+            self.after(100, self.__checkRegisterProgress)
         
         
 # ==============================================================================
@@ -431,26 +493,38 @@ class Application(tk.Frame):
     #   Key-press Event Handler
     # --------------------------------------------------------------------------
     def keyPressHandler(self, event):
-        """Handle key-press events for numeric keys. """
+        """
+        Handle key-press events for numeric keys. Number keys typed in quick
+        succession select a box with a multi-digit id, e.g. 1 then 2 selects
+        box 12.
+        
+        """
         
         key = event.char
         NUM_KEYS = ['1', '2', '3', '4', '5', '6', '7', '8', '9', '0']
         
         if key in NUM_KEYS:
-            if self.__is_verbose: print "INFO: Number-key pressed", key
+            # start a new number if the last key was typed too long ago
+            if event.time - self.__last_key_time > self.KEY_TIMEOUT:
+                self.__typed_number = ""
+            self.__last_key_time = event.time
+            self.__typed_number += key
+            number = int(self.__typed_number)
+            
+            if self.__is_verbose:
+                print "INFO: Number-key pressed", key, "- selected", number
             
             if self.spaces_button.getIsActive():
-                self.__parking_spaces.setCurrentBox(int(key))
+                self.__parking_spaces.setCurrentBox(number)
                 
             if self.cps_button.getIsActive():
-                # ignore all other numbers, but 1, 2 and 3 as 3 is the maximum
-                # number of control points allowed.
-                if key not in ['1', '2', '3']: return
+                # there is no control point 0
+                if number < 1: return
                 
-                # NB: -1 from key press, because list indices are [0, 1, 2],
-                # but for ease of user selection the numbers 1, 2, 3 are used 
+                # NB: -1 from key press, because control point ids start at 0,
+                # but for ease of user selection the numbers from 1 are used 
                 # for input
-                self.__control_points.setCurrentBox(int(key) - 1)
+                self.__control_points.setCurrentBox(number - 1)
     
     # --------------------------------------------------------------------------
     #   LMB Event Handler
@@ -463,13 +537,13 @@ class Application(tk.Frame):
         
         # perform correct operation, dependent on which toggle button is active
         
-        # add new control points (max = 3)
+        # add new control points
         if self.cps_button.getIsActive():
             if self.__is_verbose: print "INFO: Add Control Point"
             self.__is_saved = False
             
             this_cp_id = self.__control_points.getCurrentBox()
-            this_cp = self.__control_points.boxes[this_cp_id]
+            this_cp = self.__control_points.get(this_cp_id)
             this_cp.updatePoints(event.x, event.y)
         
         # add new parking space
@@ -478,7 +552,7 @@ class Application(tk.Frame):
             self.__is_saved = False
             
             this_space_id = self.__parking_spaces.getCurrentBox()
-            this_space = self.__parking_spaces.boxes[this_space_id]
+            this_space = self.__parking_spaces.get(this_space_id)
             this_space.updatePoints(event.x, event.y)
             
         # do nothing -- ignore LMB clicks
@@ -502,15 +576,15 @@ class Application(tk.Frame):
             if self.__is_verbose: print "INFO: Remove Control Point"
             self.__is_saved = False
             
-            self.__control_points.boxes[self.__control_points.getCurrentBox()].clear()
-            self.__control_points.boxes[self.__control_points.getCurrentBox()].deleteRectangle(self.display)
+            self.__control_points.get(self.__control_points.getCurrentBox()).clear()
+            self.__control_points.get(self.__control_points.getCurrentBox()).deleteRectangle(self.display)
             
         elif self.spaces_button.getIsActive():
             if self.__is_verbose: print "INFO: Remove parking space"
             self.__is_saved = False
             
-            self.__parking_spaces.boxes[self.__parking_spaces.getCurrentBox()].clear()
-            self.__parking_spaces.boxes[self.__parking_spaces.getCurrentBox()].deleteRectangle(self.display)
+            self.__parking_spaces.get(self.__parking_spaces.getCurrentBox()).clear()
+            self.__parking_spaces.get(self.__parking_spaces.getCurrentBox()).deleteRectangle(self.display)
             
         else:
             if self.__is_verbose: print "INFO: Just clicking RMB merrily =)"
@@ -568,8 +642,8 @@ class Application(tk.Frame):
                 tkMessageBox.showinfo(
                     title = "PiPark Setup",
                     message = "Saved data is invalid. Please ensure that "
-                    + "there are 3 control points and at least 1 parking "
-                    + "space marked."
+                    + "there are at least 3 control points and at least 1 "
+                    + "parking space marked."
                     )
                 return
                     
@@ -57,10 +57,27 @@ class Application(tk.Frame):
                      s.IS_VERBOSE,
                      s.PARK_ID,
                      s.SERVER_PASS,
-                     s.SERVER_URL]
+                     s.SERVER_URL,
+                     s.CAPTURE_MODE,
+                     s.FRAME_RATE,
+                     s.FRAME_SOURCE,
+                     s.FRAME_SOURCE_PATH,
+                     s.SERVER_CONNECT_TIMEOUT,
+                     s.SERVER_READ_TIMEOUT,
+                     s.SPOOL_LOCATION,
+                     s.CROP_TO_BOXES,
+                     s.ANALYSIS_SCALE,
+                     s.ANALYSIS_SCALE_CHECK,
+                     s.MAX_PICTURE_DELAY,
+                     s.GATE_STEP,
+                     s.BOX_CACHE,
+                     s.TIMING,
+                     s.TIMING_INTERVAL,
+                     s.HEADLESS,
+                     s.ANALYSIS_WORKERS]
         except:
             # can't load, create a list of defaults
-            self.defaults = ['' for i in range(11)]
+            self.defaults = ['' for i in range(28)]
 
         # define the inputs
         self.inputs = [['Wakeup Delay', 'int', 'WAKEUP_DELAY'],
@@ -73,7 +90,24 @@ class Application(tk.Frame):
                  ['Is Verbose?', 'check', 'IS_VERBOSE'],
                  ['Park ID', 'int', 'PARK_ID'],
                  ['Server Password', 'text', 'SERVER_PASS'],
-                 ['Server URL', 'text', 'SERVER_URL']]
+                 ['Server URL', 'text', 'SERVER_URL'],
+                 ['Capture Mode (file/memory/stream)', 'text', 'CAPTURE_MODE'],
+                 ['Stream Frame Rate', 'int', 'FRAME_RATE'],
+                 ['Frame Source (picamera/directory/replay/synthetic)', 'text', 'FRAME_SOURCE'],
+                 ['Frame Source Path', 'text', 'FRAME_SOURCE_PATH'],
+                 ['Server Connect Timeout', 'int', 'SERVER_CONNECT_TIMEOUT'],
+                 ['Server Read Timeout', 'int', 'SERVER_READ_TIMEOUT'],
+                 ['Update Spool Location', 'text', 'SPOOL_LOCATION'],
+                 ['Crop Frames to Boxes?', 'check', 'CROP_TO_BOXES'],
+                 ['Analysis Downsample Factor', 'int', 'ANALYSIS_SCALE'],
+                 ['Downsample Check Interval (ticks)', 'int', 'ANALYSIS_SCALE_CHECK'],
+                 ['Max Picture Delay (quiet)', 'int', 'MAX_PICTURE_DELAY'],
+                 ['Change Gate Step (0 = off)', 'int', 'GATE_STEP'],
+                 ['Cache Box Results?', 'check', 'BOX_CACHE'],
+                 ['Time Each Stage?', 'check', 'TIMING'],
+                 ['Timing Report Interval (0 = off)', 'int', 'TIMING_INTERVAL'],
+                 ['Run Headless?', 'check', 'HEADLESS'],
+                 ['Analysis Worker Processes (0 = off)', 'int', 'ANALYSIS_WORKERS']]
 
         # list of options
         self.options = [[] for i in range(len(self.inputs))]
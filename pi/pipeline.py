@@ -0,0 +1,241 @@
+"""
+Author: agent
+Filename: pipeline.py
+Version: 1.0 [2026/10/16]
+
+Description:
+Threaded detection pipeline for the PiPark Smart Parking Sensor. Capturing
+frames, analysing them and uploading changes to the server each run in their
+own thread, connected by bounded queues. When a stage falls behind, the
+oldest item waiting for it is dropped, so a slow or unreachable server never
+holds up detection, and analysis always works on the most recent frame.
+
+When run under a supervisor (see supervisor.py), a stage which crashes is
+restarted where it left off, rather than ending the pipeline.
+
+"""
+
+# -----------------------------------------------------------------------------
+#  Imports
+# -----------------------------------------------------------------------------
+# python
+import Queue
+import threading
+
+# PiPark
+import data.settings as s
+
+# default number of items each queue may hold before dropping the oldest
+FRAME_QUEUE_SIZE = 2
+UPLOAD_QUEUE_SIZE = 100
+
+# placed on a queue to tell the next stage that there are no more items
+END_OF_STREAM = None
+
+
+# ==============================================================================
+#
+#   Drop-oldest Queue
+#
+# ==============================================================================
+class DropOldestQueue(Queue.Queue):
+    """
+    Bounded queue which never blocks when it is put to. If the queue is full
+    the oldest item is dropped to make room for the new one.
+
+    If drop_oldest is False the queue behaves as a normal bounded queue
+    instead, and put() waits for room.
+
+    If given, on_drop(item) is called with each item dropped, e.g. to release
+    a dropped frame.
+
+    """
+
+    def __init__(self, maxsize, drop_oldest = True, on_drop = None):
+        Queue.Queue.__init__(self, maxsize)
+        self.drop_oldest = drop_oldest
+        self.on_drop = on_drop
+        self.dropped = 0
+
+    def put(self, item):
+        """Put an item on the queue, dropping the oldest item if full. """
+        if not self.drop_oldest:
+            Queue.Queue.put(self, item)
+            return
+
+        while True:
+            try:
+                Queue.Queue.put(self, item, False)
+                return
+            except Queue.Full:
+                try:
+                    item_dropped = self.get_nowait()
+                    self.dropped += 1
+                    if self.on_drop is not None: self.on_drop(item_dropped)
+                except Queue.Empty:
+                    pass
+
+
+# ==============================================================================
+#
+#   Pipeline Class
+#
+# ==============================================================================
+class Pipeline:
+    """
+    Run frame capture, analysis and upload in three threads.
+
+        capture -- Takes frames from the frame source.
+        analysis -- Calls analyse(frame) for each frame, which returns the
+            update to send to the server, or None (or an empty list) if there
+            is nothing to send.
+        upload -- Calls upload(update) for each update.
+
+    """
+
+    source = None
+    frame_queue = None
+    upload_queue = None
+    supervisor = None
+
+    __analyse = None
+    __upload = None
+    __stop = None
+    __threads = None
+
+    def __init__(self, source, analyse, upload,
+            frame_queue_size = FRAME_QUEUE_SIZE,
+            upload_queue_size = UPLOAD_QUEUE_SIZE, supervisor = None):
+        """
+        Arguments:
+        source -- FrameSource from which to take frames.
+        analyse -- Function called with each frame, returning an update.
+        upload -- Function called with each update.
+
+        Keyword Arguments:
+        frame_queue_size -- Frames waiting for analysis before the oldest is
+            dropped.
+        upload_queue_size -- Updates waiting for upload before the oldest is
+            dropped.
+        supervisor -- supervisor.Supervisor which starts the threads and
+            restarts any which crash. If None, a crash ends the pipeline.
+
+        """
+        self.source = source
+        self.supervisor = supervisor
+
+        # frames from live sources are dropped when analysis falls behind,
+        # whereas recordings are never dropped and capture waits instead
+        self.frame_queue = DropOldestQueue(frame_queue_size,
+            drop_oldest = source.is_live, on_drop = source.release)
+
+        # pooled frames are in use from capture until analysed, so the pool
+        # needs a buffer for each frame queued, plus the frames being
+        # captured and analysed
+        if source.pool is not None: source.pool.reserve(frame_queue_size + 2)
+        self.upload_queue = DropOldestQueue(upload_queue_size)
+
+        self.__analyse = analyse
+        self.__upload = upload
+        self.__stop = threading.Event()
+        self.__threads = []
+
+    # --------------------------------------------------------------------------
+    #   Thread Control
+    # --------------------------------------------------------------------------
+    def start(self):
+        """Start the capture, analysis and upload threads. """
+        targets = [
+            ("capture", self.__captureLoop),
+            ("analysis", self.__analysisLoop),
+            ("upload", self.__uploadLoop)
+            ]
+
+        for name, target in targets:
+            if self.supervisor is not None:
+                worker = self.supervisor.spawn(name, target, restart = True)
+            else:
+                worker = threading.Thread(target = target, name = name)
+                worker.daemon = True
+                worker.start()
+            self.__threads.append(worker)
+
+    def stop(self):
+        """Ask the threads to finish once their current item is done. """
+        self.__stop.set()
+        self.source.scheduler.cancel()
+        if self.frame_queue.drop_oldest: self.frame_queue.put(END_OF_STREAM)
+
+    def join(self):
+        """Wait for all of the threads to finish. """
+        for worker in self.__threads:
+            worker.join()
+
+    def run(self):
+        """Start the pipeline and wait until it has finished. """
+        self.start()
+        self.join()
+
+    # --------------------------------------------------------------------------
+    #   Stages
+    # --------------------------------------------------------------------------
+    def __captureLoop(self):
+        """Put each frame from the source onto the frame queue. """
+        try:
+            for frame in self.source.frames():
+                if self.__stop.is_set():
+                    self.source.release(frame)
+                    break
+
+                # the frame is not copied, as its buffer is not captured into
+                # again until the analysis has released it
+                self.frame_queue.put(frame)
+        except Exception:
+            # keep the stream open for the supervisor to restart capture
+            if not self.__isRestarting(): self.__endCapture()
+            raise
+
+        self.__endCapture()
+
+    def __endCapture(self):
+        """Close the source and tell the analysis that no frames remain. """
+        self.source.close()
+        self.frame_queue.put(END_OF_STREAM)
+
+    def __analysisLoop(self):
+        """Analyse each frame and queue the resulting updates. """
+        try:
+            while True:
+                frame = self.frame_queue.get()
+                if frame is END_OF_STREAM: break
+
+                try:
+                    update = self.__analyse(frame)
+                finally:
+                    self.source.release(frame)
+                if update: self.upload_queue.put(update)
+
+                if s.IS_VERBOSE and self.frame_queue.dropped:
+                    print "INFO: Frames dropped:", self.frame_queue.dropped
+        except Exception:
+            # only the crashed frame is lost when the analysis is restarted
+            if not self.__isRestarting(): self.upload_queue.put(END_OF_STREAM)
+            raise
+
+        self.upload_queue.put(END_OF_STREAM)
+
+    def __isRestarting(self):
+        """Return True if a stage which crashes will be restarted. """
+        return (self.supervisor is not None and not self.__stop.is_set()
+            and not self.supervisor.isQuitting())
+
+    def __uploadLoop(self):
+        """Upload each update to the server. """
+        while True:
+            update = self.upload_queue.get()
+            if update is END_OF_STREAM: break
+
+            self.__upload(update)
+
+            if s.IS_VERBOSE and self.upload_queue.dropped:
+                print "INFO: Updates dropped:", self.upload_queue.dropped
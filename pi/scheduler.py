@@ -0,0 +1,138 @@
+"""
+Author: agent
+Filename: scheduler.py
+Version: 1.0 [2026/10/16]
+
+Description:
+Adaptive tick scheduler for the PiPark Smart Parking Sensor. Frames are taken
+on a fixed wall-clock cadence, so the time spent capturing and analysing a
+frame is taken out of the wait rather than added to it. While the car park is
+quiet the cadence slows down, up to MAX_PICTURE_DELAY, and as soon as anything
+starts to change it returns to the normal rate.
+
+"""
+
+# -----------------------------------------------------------------------------
+#  Imports
+# -----------------------------------------------------------------------------
+# python
+import threading
+import time
+
+# PiPark
+import data.settings as s
+from imageread import numpy
+
+# the period grows by this factor after every tick in which nothing happened
+BACKOFF = 1.5
+
+# differences within this fraction of IMAGE_THRESHOLD from it count as
+# activity, as the space may be about to change
+NEAR_THRESHOLD = 0.25
+
+
+# -----------------------------------------------------------------------------
+#  Is Near Threshold
+# -----------------------------------------------------------------------------
+def is_near_threshold(margins, threshold = None):
+    """
+    Return True if any space came close to the threshold.
+
+    Arguments:
+    margins -- Margin of each space, from imageread.compare_areas().
+
+    Keyword Arguments:
+    threshold -- The threshold (default = IMAGE_THRESHOLD).
+
+    """
+    if not len(margins): return False
+    if threshold is None: threshold = s.IMAGE_THRESHOLD
+
+    limit = NEAR_THRESHOLD * threshold
+    if numpy is None: return min(margins) <= limit
+    return bool(numpy.min(margins) <= limit)
+
+
+# ==============================================================================
+#
+#   Tick Scheduler
+#
+# ==============================================================================
+class TickScheduler:
+    """
+    Paces the ticks of a frame source. wait() returns once every 'period'
+    seconds, measured from when the previous tick was due rather than when
+    it finished. If a tick runs late by more than a whole period the cadence
+    starts again from then, rather than rushing through the missed ticks.
+
+    The analysis reports each tick whether anything is happening through
+    setActive(). Quiet ticks lengthen the period, up to max_period, and an
+    active tick returns it to min_period straight away, cutting short any
+    wait in progress.
+
+    """
+
+    min_period = 0
+    max_period = 0
+    period = 0
+
+    __last = None
+    __wake = None
+    __is_cancelled = False
+
+    def __init__(self, period, max_period = None):
+        """
+        Arguments:
+        period -- Normal seconds between ticks, used while active.
+
+        Keyword Arguments:
+        max_period -- Longest seconds between ticks, while quiet. If None or
+            no longer than period the cadence does not adapt.
+
+        """
+        if max_period is None: max_period = period
+
+        self.min_period = period
+        self.max_period = max(period, max_period)
+        self.period = period
+        self.__wake = threading.Event()
+
+    def wait(self):
+        """Wait until the next tick is due. """
+        if self.__last is not None and self.min_period > 0:
+            # the period may shrink while waiting, so check again on waking
+            while not self.__is_cancelled:
+                delay = self.__last + self.period - time.time()
+                if delay <= 0: break
+
+                if s.IS_VERBOSE:
+                    print "INFO: Next frame in %.1f seconds... Zzz." % delay
+                if not self.__wake.wait(delay): break
+                self.__wake.clear()
+
+        now = time.time()
+        if self.__last is None:
+            self.__last = now
+        else:
+            due = self.__last + self.period
+            self.__last = due if now - due < self.period else now
+
+    def setActive(self, is_active):
+        """
+        Adapt the period to what happened in the last tick.
+
+        Arguments:
+        is_active -- True if the scene is changing, or may be about to.
+
+        """
+        if is_active:
+            if self.period > self.min_period:
+                self.period = self.min_period
+                self.__wake.set()
+        else:
+            self.period = min(self.max_period, self.period * BACKOFF)
+
+    def cancel(self):
+        """Stop waiting, e.g. when the source is being stopped. """
+        self.__is_cancelled = True
+        self.__wake.set()
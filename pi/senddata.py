@@ -9,11 +9,174 @@ Pi Car Park sensor server communication module.
 Used to send update data about changed in the car parking spaces
 to a central server.
 
+All requests share a pool of persistent (keep-alive) connections,
+so a TCP handshake is only needed when the server closes one.
+
 """
+import errno
+import httplib
+import Queue
+import socket
+import threading
 import urllib
-import urllib2
+import urlparse
 import json
 import data.settings as s
+import timing
+
+
+class ConnectionPool:
+    """
+    Pool of persistent HTTP connections, kept open between requests
+    and reused for later requests to the same server.
+
+    Connections time out after SERVER_CONNECT_TIMEOUT seconds when
+    connecting and SERVER_READ_TIMEOUT seconds when waiting for a
+    response, so a hung server cannot block the caller forever.
+    """
+
+    def __init__(self, max_idle=4):
+        """
+        Args:
+            max_idle: Idle connections kept open per server.
+        """
+        self.max_idle = max_idle
+        self.__idle = {}
+        self.__lock = threading.Lock()
+
+    def __get(self, key):
+        """Take an idle connection to a server, or open a new one."""
+        with self.__lock:
+            idle = self.__idle.get(key)
+            if idle:
+                return idle.pop(), True
+
+        scheme, host, port = key
+        if scheme == "https":
+            connection = httplib.HTTPSConnection(
+                host, port, timeout=s.SERVER_CONNECT_TIMEOUT)
+        else:
+            connection = httplib.HTTPConnection(
+                host, port, timeout=s.SERVER_CONNECT_TIMEOUT)
+
+        # Connect now, then allow longer for the responses
+        connection.connect()
+        connection.sock.settimeout(s.SERVER_READ_TIMEOUT)
+        return connection, False
+
+    def __put(self, key, connection):
+        """Return a connection to the pool once it is finished with."""
+        with self.__lock:
+            idle = self.__idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def post(self, url, data, headers):
+        """
+        Send a POST request, reusing an open connection if possible.
+
+        Args:
+            url: URL to send the data to.
+            data: Body of the request.
+            headers: Dictionary of extra request headers.
+
+        Returns:
+            Tuple of (status, reason, body) of the response.
+
+        Raises:
+            socket.error, httplib.HTTPException: If the request
+                could not be sent or the response not read.
+        """
+        parts = urlparse.urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        headers = dict(headers)
+        headers["Connection"] = "keep-alive"
+
+        while True:
+            connection, is_reused = self.__get(key)
+
+            # The server may have closed an idle connection, so try
+            # again with a new connection, but only if the server
+            # cannot have received the request. A timeout is never
+            # retried, as the server may still be handling it.
+            try:
+                connection.request("POST", path, data, headers)
+            except socket.timeout:
+                connection.close()
+                raise
+            except (socket.error, httplib.HTTPException):
+                connection.close()
+                if is_reused:
+                    continue
+                raise
+
+            try:
+                response = connection.getresponse()
+            except socket.timeout:
+                connection.close()
+                raise
+            except (socket.error, httplib.HTTPException), err:
+                connection.close()
+                if is_reused and is_closed_unanswered(err):
+                    continue
+                raise
+
+            try:
+                body = response.read()
+            except (socket.error, httplib.HTTPException):
+                connection.close()
+                raise
+
+            if response.will_close:
+                connection.close()
+            else:
+                self.__put(key, connection)
+
+            return response.status, response.reason, body
+
+    def close(self):
+        """Close all of the idle connections."""
+        with self.__lock:
+            for idle in self.__idle.values():
+                for connection in idle:
+                    connection.close()
+            self.__idle = {}
+
+
+def is_closed_unanswered(err):
+    """
+    Check whether an error waiting for a response means the
+    server closed the connection without sending any of one,
+    as it does with a connection which has been idle too long.
+
+    Args:
+        err: Exception raised by getresponse().
+
+    Returns:
+        True if no response was received at all.
+    """
+    if isinstance(err, httplib.BadStatusLine):
+        line = err.line or ""
+        return not line or line.startswith("No status line")
+    return (isinstance(err, socket.error) and
+            err.errno == errno.ECONNRESET)
+
+
+# Connection pool shared by all requests to the server
+pool = ConnectionPool()
+
+# Error returned when the server cannot be reached
+CONNECTION_ERROR = "Error in connecting to server."
+
+# Most registration requests in flight at once
+REGISTER_CONCURRENCY = 4
+
 
 def post_request(vals, url):
     """
@@ -29,17 +192,49 @@ def post_request(vals, url):
     """
     # Build the request and send to server
     data = urllib.urlencode(vals)
+    headers = {"Content-Type": "application/x-www-form-urlencoded"}
     
+    return send_request(url, data, headers)
+
+def post_json(vals, url):
+    """
+    Build a post request with a JSON body.
+
+    Args:
+        vals: Dictionary of values to send as JSON.
+        url: URL to send the data to.
+
+    Returns:
+        Dictionary of JSON response or error info.
+    """
+    # Build the request and send to server
+    data = json.dumps(vals)
+    headers = {"Content-Type": "application/json"}
+    
+    return send_request(url, data, headers)
+
+def send_request(url, data, headers):
+    """
+    Send a POST request to the server over a pooled connection.
+
+    Args:
+        url: URL to send the data to.
+        data: Body of the request.
+        headers: Dictionary of extra request headers.
+
+    Returns:
+        Dictionary of JSON response or error info.
+    """
     try:
-        request  = urllib2.Request(url, data)
-        response = urllib2.urlopen(request)
-    except urllib2.HTTPError, err:
-        return {"error": err.reason, "error_code": err.code}
+        with timing.timed("upload"):
+            status, reason, body = pool.post(url, data, headers)
     except:
-        return {"error": "Error in connecting to server."}
+        return {"error": CONNECTION_ERROR}
+    if status >= 400:
+        return {"error": reason, "error_code": status}
     # Return the response parsed as a array from json
     try:
-        return json.loads(response.read())
+        return json.loads(body)
     except ValueError, err:
         return {"error": "JSON decoding error"}
 
@@ -65,6 +260,30 @@ def send_update(area_id, status_code):
     return post_request(vals, s.SERVER_URL + "recieve.php")
 
 
+def send_updates(updates):
+    """
+    Sends the status of many parking spaces to the server in
+    a single HTTP POST request. The server saves the updates
+    in one transaction, leaving out those for areas which are
+    not registered.
+
+    Args:
+        updates: List of (area_id, status_code) pairs.
+
+    Returns:
+        Dictionary of elements from the JSON response. The area
+        ids refused by the server are listed under "rejected".
+    """
+    # Create the post data
+    vals = {"update_password" : s.SERVER_PASS,
+            "update_park_id" : s.PARK_ID,
+            "update_pi_id" : s.PI_ID,
+            "updates" : [[area_id, status_code]
+                         for area_id, status_code in updates]}
+
+    return post_json(vals, s.SERVER_URL + "recieve_batch.php")
+
+
 def register_area(area_id):
     """
     Sends the data to register a new parking space to the
@@ -85,6 +304,53 @@ def register_area(area_id):
     return post_request(vals, s.SERVER_URL + "register.php")
 
 
+def register_areas(area_ids, max_requests=REGISTER_CONCURRENCY,
+                   progress=None):
+    """
+    Registers many parking spaces on the server, sending up to
+    max_requests requests at once rather than one after another.
+
+    Args:
+        area_ids: List of area ids to register.
+        max_requests: Most requests in flight at once.
+        progress: Function called from the worker threads after
+            each area, with (area_id, output, num_done, num_total).
+
+    Returns:
+        Dictionary of the JSON response of each area id.
+    """
+    pending = Queue.Queue()
+    for area_id in area_ids:
+        pending.put(area_id)
+
+    results = {}
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            try:
+                area_id = pending.get_nowait()
+            except Queue.Empty:
+                return
+
+            output = register_area(area_id)
+            with lock:
+                results[area_id] = output
+                num_done = len(results)
+
+            if progress:
+                progress(area_id, output, num_done, len(area_ids))
+
+    workers = [threading.Thread(target=worker)
+               for i in range(min(max_requests, len(area_ids)))]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    return results
+
+
 def deregister_pi():
     """
     Deregisters all areas associated with this pi.
@@ -351,22 +351,23 @@ class ControlPoint:
 #
 # ==============================================================================
 class Boxes:
-    boxes = []
+    # boxes are created the first time their id is used, and are kept in a
+    # dictionary by id, so there is no limit on the number of boxes or their ids
+    boxes = {}
     
     current_box = 1
     __type = 0
-    
-    MAX_SPACES = 10
-    MAX_CPS = 3
+    __canvas = None
     
     def __init__(self, canvas, type = 0):
+        self.boxes = {}
+        self.__canvas = canvas
+        
         if type == 0:
             self.__type = 0
-            self.boxes = [ParkingSpace(i, canvas) for i in range(self.MAX_SPACES)]
         elif type == 1:
             self.__type = 1
             self.current_box = 0
-            self.boxes = [ControlPoint(j, canvas) for j in range(self.MAX_CPS)]
         else:
             print "ERROR: setup_classes.Boxes requires type 0 or 1."
         return
@@ -379,8 +380,16 @@ class Boxes:
         return self.current_box
 
     def get(self, id):
+        """Return the box with the given id, creating it if it is new. """
+        if id not in self.boxes:
+            if self.__type == 0: self.boxes[id] = ParkingSpace(id, self.__canvas)
+            else: self.boxes[id] = ControlPoint(id, self.__canvas)
         return self.boxes[id]
 
+    def ids(self):
+        """Return the ids of every box created so far, in ascending order. """
+        return sorted(self.boxes.keys())
+
     def length(self):
         return len(self.boxes)
 
@@ -392,6 +401,7 @@ class Boxes:
         if self.__type == 0: self.setCurrentBox(1)
         elif self.__type == 1: self.setCurrentBox(0)
 
-        for box in self.boxes:
+        for box in self.boxes.values():
             box.clear()
-            box.deleteRectangle(canvas)
\ No newline at end of file
+            box.deleteRectangle(canvas)
+        self.boxes = {}
\ No newline at end of file
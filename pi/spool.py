@@ -0,0 +1,240 @@
+"""
+Author: agent
+Filename: spool.py
+Version: 1.0 [2026/10/16]
+
+Description:
+Durable queue of updates waiting to be sent to the server. Every change in a
+parking space's status is first written to a small SQLite file, then a
+background thread sends the waiting updates to the server in order, in
+batches, and deletes them once the server has saved them. If the server
+cannot be reached, or fails to save them, the updates stay on disk until it
+comes back, even across a reboot. Only updates for areas which the server
+refuses, e.g. areas no longer registered, are dropped.
+
+"""
+
+# -----------------------------------------------------------------------------
+#  Imports
+# -----------------------------------------------------------------------------
+# python
+import sqlite3
+import threading
+
+# PiPark
+import data.settings as s
+import senddata
+
+# most updates sent to the server in one request
+FLUSH_BATCH_SIZE = 50
+
+# seconds to wait before trying again after failing to send the updates. The
+# wait doubles after each failure, up to the maximum.
+RETRY_DELAY = 5
+MAX_RETRY_DELAY = 300
+
+
+# ==============================================================================
+#
+#   Update Spool
+#
+# ==============================================================================
+class UpdateSpool:
+    """
+    Append-only store of (area id, status) updates, kept in order in an
+    SQLite file. Safe to use from several threads.
+
+    """
+
+    location = None
+    __connection = None
+    __lock = None
+
+    def __init__(self, location = None):
+        """
+        Keyword Arguments:
+        location -- Path of the SQLite file (default = SPOOL_LOCATION).
+
+        """
+        if location is None: location = s.SPOOL_LOCATION
+        self.location = location
+        self.__lock = threading.Lock()
+
+        self.__connection = sqlite3.connect(location, check_same_thread = False)
+        self.__connection.execute(
+            "CREATE TABLE IF NOT EXISTS updates ("
+            "update_id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "area_id INTEGER NOT NULL, "
+            "status INTEGER NOT NULL)"
+            )
+        self.__connection.commit()
+
+    def append(self, updates):
+        """
+        Add updates to the end of the spool.
+
+        Arguments:
+        updates -- List of (area id, status) pairs.
+
+        """
+        with self.__lock:
+            self.__connection.executemany(
+                "INSERT INTO updates (area_id, status) VALUES (?, ?)",
+                updates)
+            self.__connection.commit()
+
+    def peek(self, limit = FLUSH_BATCH_SIZE):
+        """
+        Return the oldest updates, without removing them.
+
+        Keyword Arguments:
+        limit -- Most updates returned.
+
+        Returns:
+        updates -- List of (update id, area id, status) tuples, oldest first.
+
+        """
+        with self.__lock:
+            return self.__connection.execute(
+                "SELECT update_id, area_id, status FROM updates "
+                "ORDER BY update_id LIMIT ?", (limit, )).fetchall()
+
+    def remove(self, last_id):
+        """
+        Remove every update up to and including last_id.
+
+        Arguments:
+        last_id -- Update id of the last update to remove.
+
+        """
+        with self.__lock:
+            self.__connection.execute(
+                "DELETE FROM updates WHERE update_id <= ?", (last_id, ))
+            self.__connection.commit()
+
+    def count(self):
+        """Return the number of updates waiting in the spool. """
+        with self.__lock:
+            return self.__connection.execute(
+                "SELECT COUNT(*) FROM updates").fetchone()[0]
+
+    def compact(self):
+        """
+        Remove updates which do not change the status of their space, i.e.
+        those with the same status as the update before them for the same
+        space. Every real change of status is kept. Once the spool is empty
+        any free space is also returned from the file.
+
+        """
+        with self.__lock:
+            self.__connection.execute(
+                "DELETE FROM updates WHERE status = ("
+                "SELECT previous.status FROM updates AS previous "
+                "WHERE previous.area_id = updates.area_id "
+                "AND previous.update_id < updates.update_id "
+                "ORDER BY previous.update_id DESC LIMIT 1)"
+                )
+            self.__connection.commit()
+
+            is_empty = self.__connection.execute(
+                "SELECT COUNT(*) FROM updates").fetchone()[0] == 0
+            free_pages = self.__connection.execute(
+                "PRAGMA freelist_count").fetchone()[0]
+            if is_empty and free_pages: self.__connection.execute("VACUUM")
+
+    def close(self):
+        with self.__lock:
+            self.__connection.close()
+
+
+# ==============================================================================
+#
+#   Spool Flusher
+#
+# ==============================================================================
+class SpoolFlusher(threading.Thread):
+    """
+    Background thread which sends the updates in a spool to the server, oldest
+    first, FLUSH_BATCH_SIZE at a time. It runs whenever woken up, and retries
+    on its own after failing to send them.
+
+    """
+
+    def __init__(self, spool):
+        """
+        Arguments:
+        spool -- UpdateSpool to flush.
+
+        """
+        threading.Thread.__init__(self, name = "flusher")
+        self.daemon = True
+
+        self.spool = spool
+        self.__wake = threading.Event()
+        self.__stop = threading.Event()
+
+    def wake(self):
+        """Flush the spool now, e.g. after new updates are added. """
+        self.__wake.set()
+
+    def stop(self):
+        """Stop the thread after the current batch. """
+        self.__stop.set()
+        self.__wake.set()
+
+    def run(self):
+        # send anything left in the spool from before, e.g. before a reboot
+        self.spool.compact()
+        self.__wake.set()
+        retry_delay = None
+
+        while not self.__stop.is_set():
+            self.__wake.wait(retry_delay)
+            self.__wake.clear()
+
+            if self.flush():
+                retry_delay = None
+            else:
+                # not sent, so back off before trying again
+                if retry_delay is None: retry_delay = RETRY_DELAY
+                else: retry_delay = min(MAX_RETRY_DELAY, 2 * retry_delay)
+                if s.IS_VERBOSE:
+                    print "INFO:", self.spool.count(), "update(s) spooled.",
+                    print "Retrying in", retry_delay, "seconds."
+
+    def flush(self):
+        """
+        Send every update in the spool to the server.
+
+        Returns:
+        Boolean -- True if the spool was emptied, False if a batch could not
+            be sent and is kept to try again later.
+
+        """
+        while not self.__stop.is_set():
+            batch = self.spool.peek()
+            if not batch: break
+
+            updates = [(area_id, status) for update_id, area_id, status in batch]
+            sendoutput = senddata.send_updates(updates)
+
+            # keep the whole batch to try again later unless the server has
+            # saved it, e.g. if the server could not be reached or its
+            # database failed
+            if "success" not in sendoutput.keys():
+                print "      Error:", sendoutput.get("error", sendoutput)
+                return False
+
+            print "      Success:", sendoutput["success"]
+
+            # the server saves the rest of the batch without the updates for
+            # areas it refuses, so those are dropped for good
+            rejected = sendoutput.get("rejected", [])
+            if rejected:
+                print "      Refused area(s):", ", ".join(
+                    str(area_id) for area_id in rejected)
+
+            self.spool.remove(batch[-1][0])
+
+        self.spool.compact()
+        return True
@@ -0,0 +1,183 @@
+"""
+Author: agent
+Filename: supervisor.py
+Version: 1.0 [2026/10/16]
+
+Description:
+Runtime supervisor for the PiPark Smart Parking Sensor. Starts the threads of
+the program, restarts those which crash, and shuts them all down cleanly when
+the user quits or the program is sent SIGTERM or SIGINT. The main thread
+sleeps until then, rather than spinning.
+
+"""
+
+# -----------------------------------------------------------------------------
+#  Imports
+# -----------------------------------------------------------------------------
+# python
+import signal
+import threading
+import time
+import traceback
+
+# PiPark
+import data.settings as s
+
+# seconds to wait before restarting a thread which has crashed
+RESTART_DELAY = 5
+
+# longest the main thread sleeps before checking whether to quit. Signals cut
+# the sleep short, so this only matters when quitting from another thread.
+WAIT_INTERVAL = 1
+
+# seconds to wait for the threads to finish when quitting
+SHUTDOWN_TIMEOUT = 10
+
+
+# ==============================================================================
+#
+#   Supervisor
+#
+# ==============================================================================
+class Supervisor:
+    """
+    Starts and watches the threads of the program.
+
+        restarts -- Number of times each thread has been restarted, by name.
+
+    """
+
+    restarts = None
+
+    __quit = None
+    __threads = None
+    __handlers = None
+    __lock = None
+
+    def __init__(self):
+        self.restarts = {}
+        self.__quit = threading.Event()
+        self.__threads = []
+        self.__handlers = []
+        self.__lock = threading.Lock()
+
+    # --------------------------------------------------------------------------
+    #   Threads
+    # --------------------------------------------------------------------------
+    def spawn(self, name, target, restart = False):
+        """
+        Start a thread running target(). The thread is a daemon, so it cannot
+        keep the program running once the main thread has finished.
+
+        Arguments:
+        name -- Name of the thread, used in messages.
+        target -- Function run by the thread.
+
+        Keyword Arguments:
+        restart -- Run target() again, after RESTART_DELAY seconds, whenever
+            it raises an exception, until quit() is called.
+
+        Returns:
+        thread -- The threading.Thread.
+
+        """
+        worker = threading.Thread(target = self.__runWorker,
+            args = (name, target, restart), name = name)
+        worker.daemon = True
+
+        with self.__lock: self.__threads.append(worker)
+        worker.start()
+
+        return worker
+
+    def join(self, timeout = SHUTDOWN_TIMEOUT):
+        """
+        Wait for every thread to finish.
+
+        Keyword Arguments:
+        timeout -- Longest to wait in all, in seconds, or None to wait for as
+            long as it takes.
+
+        Returns:
+        Boolean -- True if every thread has finished.
+
+        """
+        end = None
+        if timeout is not None: end = time.time() + timeout
+
+        with self.__lock: workers = list(self.__threads)
+
+        for worker in workers:
+            if worker is threading.current_thread(): continue
+            if end is None: worker.join()
+            else: worker.join(max(0, end - time.time()))
+
+        return not any(worker.is_alive() for worker in workers
+            if worker is not threading.current_thread())
+
+    def __runWorker(self, name, target, restart):
+        """Run a thread's target, restarting it if it crashes. """
+        while True:
+            try:
+                target()
+                return
+            except Exception:
+                print "ERROR: Thread '" + name + "' has crashed:"
+                traceback.print_exc()
+
+                if not restart or self.__quit.is_set(): return
+
+            print "INFO: Restarting thread '" + name + "' in", RESTART_DELAY,
+            print "seconds."
+            if self.__quit.wait(RESTART_DELAY): return
+            self.restarts[name] = self.restarts.get(name, 0) + 1
+
+    # --------------------------------------------------------------------------
+    #   Quitting
+    # --------------------------------------------------------------------------
+    def onQuit(self, handler):
+        """
+        Call handler() when quitting, e.g. to ask a thread to stop. Handlers
+        are called in the order they were added, from whichever thread called
+        quit().
+
+        """
+        with self.__lock: self.__handlers.append(handler)
+
+    def quit(self, *args):
+        """
+        Quit the program. Only the first call has any effect. Takes and
+        ignores any arguments, so that it can also be used as a signal
+        handler.
+
+        """
+        with self.__lock:
+            if self.__quit.is_set(): return
+            self.__quit.set()
+            handlers = list(self.__handlers)
+
+        if s.IS_VERBOSE: print "INFO: Quitting..."
+
+        for handler in handlers:
+            try:
+                handler()
+            except Exception:
+                traceback.print_exc()
+
+    def isQuitting(self):
+        """Return True once quit() has been called. """
+        return self.__quit.is_set()
+
+    def handleSignals(self):
+        """Quit on SIGTERM or SIGINT. Must be called from the main thread. """
+        signal.signal(signal.SIGTERM, self.quit)
+        signal.signal(signal.SIGINT, self.quit)
+
+    def wait(self):
+        """
+        Sleep until quit() is called. Called from the main thread, which must
+        wake up now and then to handle signals.
+
+        """
+        while not self.__quit.is_set():
+            time.sleep(WAIT_INTERVAL)
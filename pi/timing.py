@@ -0,0 +1,255 @@
+"""
+Author: agent
+Filename: timing.py
+Version: 1.0 [2026/10/16]
+
+Description:
+Timing of the stages of each tick of the PiPark Smart Parking Sensor, i.e.
+capturing, writing and decoding pictures, averaging and comparing the boxes,
+uploading to the server and updating the GUI. The most recent durations of
+each stage are kept in memory, and reported as percentiles and a histogram
+every TIMING_INTERVAL seconds, or whenever dump() is called, e.g. on SIGUSR1.
+
+Timing is off unless TIMING is set. While it is off timed() returns the same
+do-nothing context manager every time, so the stages cost one function call.
+
+"""
+
+# -----------------------------------------------------------------------------
+#  Imports
+# -----------------------------------------------------------------------------
+# python
+import collections
+import threading
+import time
+
+# PiPark
+import data.settings as s
+
+# number of the most recent durations of each stage kept
+NUM_SAMPLES = 1000
+
+# upper bounds in milliseconds of the buckets of the histogram, the last
+# bucket holding everything slower
+BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000]
+
+# stages, in the order they are reported
+STAGES = ["capture", "file write", "decode", "averaging", "compare",
+    "upload", "tk update"]
+
+is_enabled = False
+__stages = {}
+__lock = threading.Lock()
+
+
+# ==============================================================================
+#
+#   Stage Times
+#
+# ==============================================================================
+class StageTimes:
+    """
+    Rolling record of the durations of one stage.
+
+        count -- Number of durations recorded in all.
+        total -- Sum of every duration recorded, in seconds.
+        samples -- The most recent NUM_SAMPLES durations, in seconds.
+
+    """
+
+    count = 0
+    total = 0.0
+    samples = None
+
+    def __init__(self):
+        self.samples = collections.deque(maxlen = NUM_SAMPLES)
+
+    def add(self, seconds):
+        """Record one duration, in seconds. """
+        self.count += 1
+        self.total += seconds
+        self.samples.append(seconds)
+
+    def getPercentiles(self, percents):
+        """
+        Return the durations below which each percentage of the recent
+        durations fall, in seconds, or None if none have been recorded.
+
+        Arguments:
+        percents -- List of percentages, e.g. [50, 90, 99].
+
+        """
+        ordered = sorted(self.samples)
+        if not ordered: return None
+
+        last = len(ordered) - 1
+        return [ordered[min(last, int(round(last * percent / 100.0)))]
+            for percent in percents]
+
+    def getHistogram(self):
+        """Return the number of recent durations in each of the BUCKETS. """
+        counts = [0 for i in range(len(BUCKETS) + 1)]
+
+        for seconds in self.samples:
+            milliseconds = seconds * 1000
+            bucket = 0
+            while bucket < len(BUCKETS) and milliseconds > BUCKETS[bucket]:
+                bucket += 1
+            counts[bucket] += 1
+
+        return counts
+
+
+# ==============================================================================
+#
+#   Timer
+#
+# ==============================================================================
+class Timer:
+    """Context manager recording how long its block takes as a stage. """
+
+    stage = None
+    __start = 0
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.__start = time.time()
+        return self
+
+    def __exit__(self, error_type, error, traceback):
+        record(self.stage, time.time() - self.__start)
+        return False
+
+
+class NullTimer:
+    """Context manager which does nothing, used while timing is off. """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, error_type, error, traceback):
+        return False
+
+__null_timer = NullTimer()
+
+
+# -----------------------------------------------------------------------------
+#  Enable
+# -----------------------------------------------------------------------------
+def enable(is_on = True):
+    """Turn timing on or off. Durations already recorded are kept. """
+    global is_enabled
+    is_enabled = is_on
+
+
+# -----------------------------------------------------------------------------
+#  Timed
+# -----------------------------------------------------------------------------
+def timed(stage):
+    """
+    Return a context manager which records how long its block takes, e.g.
+
+        with timing.timed("decode"):
+            image.load()
+
+    Arguments:
+    stage -- Name of the stage, usually one of STAGES.
+
+    """
+    if not is_enabled: return __null_timer
+    return Timer(stage)
+
+
+# -----------------------------------------------------------------------------
+#  Record
+# -----------------------------------------------------------------------------
+def record(stage, seconds):
+    """
+    Record one duration of a stage, if timing is on.
+
+    Arguments:
+    stage -- Name of the stage, usually one of STAGES.
+    seconds -- How long it took.
+
+    """
+    if not is_enabled: return
+
+    with __lock:
+        times = __stages.get(stage)
+        if times is None: times = __stages[stage] = StageTimes()
+        times.add(seconds)
+
+
+# -----------------------------------------------------------------------------
+#  Report
+# -----------------------------------------------------------------------------
+def report():
+    """
+    Return a table of the percentiles and histogram of every stage timed so
+    far, in milliseconds, as a string.
+
+    """
+    with __lock:
+        names = [name for name in STAGES if name in __stages]
+        names += sorted(name for name in __stages if name not in STAGES)
+
+        lines = ["%-12s %8s %8s %8s %8s %8s %8s" % ("stage", "count",
+            "mean", "p50", "p90", "p99", "max")]
+        histogram = ["%-12s %s" % ("ms <=", " ".join("%5d" % bound
+            for bound in BUCKETS) + "  more")]
+
+        for name in names:
+            times = __stages[name]
+            p50, p90, p99, top = times.getPercentiles([50, 90, 99, 100])
+            lines.append("%-12s %8d %8.1f %8.1f %8.1f %8.1f %8.1f" % (name,
+                times.count, 1000 * times.total / times.count, 1000 * p50,
+                1000 * p90, 1000 * p99, 1000 * top))
+            histogram.append("%-12s %s" % (name, " ".join("%5d" % count
+                for count in times.getHistogram())))
+
+    return "\n".join(lines + [""] + histogram)
+
+
+# -----------------------------------------------------------------------------
+#  Dump
+# -----------------------------------------------------------------------------
+def dump(*args):
+    """
+    Print the timing report. Takes and ignores any arguments, so that it can
+    also be used as a signal handler.
+
+    """
+    print "INFO: Timings of the most recent", NUM_SAMPLES, "of each stage:"
+    print report()
+    print ""
+
+
+# ==============================================================================
+#
+#   Reporter
+#
+# ==============================================================================
+class Reporter(threading.Thread):
+    """Background thread which prints the timing report at intervals. """
+
+    def __init__(self, interval = None):
+        """
+        Keyword Arguments:
+        interval -- Seconds between reports (default = TIMING_INTERVAL).
+
+        """
+        threading.Thread.__init__(self, name = "timing")
+        self.daemon = True
+
+        if interval is None: interval = s.TIMING_INTERVAL
+        self.interval = interval
+        self.__stop = threading.Event()
+
+    def stop(self):
+        self.__stop.set()
+
+    def run(self):
+        while not self.__stop.wait(self.interval):
+            dump()
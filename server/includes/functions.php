@@ -17,7 +17,9 @@ function json_error( $message ){
 }
 
 /**
- * Get the query to find the number of spaces in the car park.
+ * Get the query to find the number of spaces in the car park. The latest
+ * update of each space is the one with the highest update_id, as a batch of
+ * updates from a pi can share the same update_time.
  * @param $id id of the space to find
  * @return the query for that space
  */
@@ -27,12 +29,11 @@ function get_num_space_query($id){
 		LEFT JOIN (
 			SELECT *
 			FROM updates b
-			WHERE update_time = (
-				SELECT max( update_time )
+			WHERE update_id = (
+				SELECT max( update_id )
 				FROM updates um
 				WHERE um.update_space_id = b.update_space_id
 			)
-			GROUP BY update_space_id
 		) b ON a.space_id = b.update_space_id
 		WHERE a.space_park_id = " . ($id) . " AND b.update_status <> 0";
 }
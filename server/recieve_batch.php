@@ -0,0 +1,115 @@
+<?php
+
+/** 
+ * File for recieving a batch of updates from the pi's via a HTTP request.
+ * 
+ * The request body is JSON, holding the pi's details and a list of
+ * [area_id, status] pairs. Updates for areas not registered exactly once to
+ * the pi are refused and listed in the reply as "rejected", and the rest are
+ * written in one transaction. If the database fails nothing is saved, and the
+ * reply has status 503 so that the pi sends the updates again later.
+ * 
+ * @author	agent
+ * @version	1.0 (2026-10-16)
+ */
+ 
+require_once( 'init.php' );
+
+// Set the content as json
+header('Content-type: application/json; charset=UTF-8');
+
+// Decode the JSON request body
+$data = json_decode( file_get_contents( 'php://input' ), true );
+if( !is_array( $data ) )
+	json_error( 'Invalid JSON data.' );
+
+// Checks that all the required keys are present in the data
+$keys = array( "update_password", "update_park_id", "update_pi_id", "updates" );
+foreach( $keys as $key )
+	if( !array_key_exists( $key, $data ) )
+		json_error( 'Incomplete post data.' );
+
+// Check that the password is correct
+if( $data[ 'update_password' ] != Conf::PI_PASSWORD )
+	json_error( 'Password incorrect.' );
+
+// Check that there is a list of updates
+$updates = $data[ 'updates' ];
+if( !is_array( $updates ) || count( $updates ) == 0 )
+	json_error( 'No updates.' );
+
+// Reply to a failure of the database, which is worth trying again later
+function database_error() {
+	header( 'HTTP/1.1 503 Service Unavailable' );
+	json_error( 'Database update failed.' );
+}
+
+// Get the space_id of every area registered to this pi and park at once
+$query = "SELECT space_id, space_area_code FROM spaces WHERE space_park_id = ? AND space_pi_id = ?";
+$stmt  = DB::get()->prepare($query);
+if( !$stmt )
+	database_error();
+$stmt->bindValue( 1, $data[ "update_park_id" ], PDO::PARAM_INT );
+$stmt->bindValue( 2, $data[ "update_pi_id" ], PDO::PARAM_INT );
+if( !$stmt->execute() )
+	database_error();
+
+// Map each area code to its space id, and count the rows for each area
+$spaces = array();
+$counts = array();
+while( $row = $stmt->fetch( PDO::FETCH_ASSOC ) ) {
+	$area = (int) $row[ 'space_area_code' ];
+	$spaces[ $area ] = $row[ 'space_id' ];
+	$counts[ $area ] = isset( $counts[ $area ] ) ? $counts[ $area ] + 1 : 1;
+}
+
+// Only save updates for areas registered exactly once. The others are
+// refused on their own, without holding up the rest of the tick.
+$accepted = array();
+$rejected = array();
+foreach( $updates as $update ) {
+	if( !is_array( $update ) || count( $update ) != 2 )
+		json_error( 'Invalid update data.' );
+	
+	$area = (int) $update[ 0 ];
+	if( isset( $counts[ $area ] ) && $counts[ $area ] == 1 )
+		$accepted[] = $update;
+	else if( !in_array( $area, $rejected ) )
+		$rejected[] = $area;
+}
+
+// Update the database with the new values, in a single transaction.
+if( count( $accepted ) > 0 ) {
+	$db = DB::get();
+	if( !$db->beginTransaction() )
+		database_error();
+	
+	$query2 = "INSERT INTO updates (update_space_id, update_status) VALUES (?, ?)";
+	$stmt2  = $db->prepare( $query2 );
+	if( !$stmt2 ) {
+		$db->rollBack();
+		database_error();
+	}
+	
+	foreach( $accepted as $update ) {
+		$stmt2->bindValue( 1, $spaces[ (int) $update[ 0 ] ], PDO::PARAM_INT );
+		$stmt2->bindValue( 2, $update[ 1 ], PDO::PARAM_INT );
+		
+		if( !$stmt2->execute() ) {
+			$db->rollBack();
+			database_error();
+		}
+	}
+	
+	if( !$db->commit() )
+		database_error();
+}
+
+// Return success, with the areas whose updates were refused.
+echo json_encode( array(
+	"success"  => "Database updated.",
+	"count"    => count( $accepted ),
+	"rejected" => $rejected
+) );
+
+?>
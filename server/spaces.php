@@ -80,18 +80,19 @@ require_once ('includes/header.php');
 			LEFT JOIN spaces c ON space_id = a.update_space_id
 			WHERE space_park_id = ".$id;*/
 
-	// Get the status of the car parking spaces
+	// Get the status of the car parking spaces. The latest update of a space
+	// is the one with the highest id, as a batch of updates from a pi can
+	// share the same update_time.
 	$query = "SELECT * 
 			FROM spaces a
 			LEFT JOIN (
 				SELECT *
 				FROM updates b
-				WHERE update_time = (
-					SELECT max( update_time )
+				WHERE update_id = (
+					SELECT max( update_id )
 					FROM updates um
 					WHERE um.update_space_id = b.update_space_id
 				)
-				GROUP BY b.update_space_id
 			) b ON a.space_id = b.update_space_id
 			WHERE space_park_id = ".$id;
 